@@ -0,0 +1,101 @@
+import csv
+import hashlib
+import io
+import json
+
+from django.db.models import F
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from foodgram.models import ShoppingListItem
+
+
+class ShoppingListTextRenderer(BaseRenderer):
+    media_type = "text/plain"
+    format = "txt"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = "\n".join(str(value) for value in data.values())
+        return str(data).encode(self.charset)
+
+
+class ShoppingListCSVRenderer(ShoppingListTextRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    JSONRenderer,
+)
+
+
+def shopping_list_rows(user):
+    return (
+        ShoppingListItem.objects.filter(user=user)
+        .values(
+            name=F("ingredient__name"),
+            measurement_unit=F("ingredient__measurement_unit"),
+            amount=F("total_amount"),
+        )
+        .order_by("name", "measurement_unit")
+    )
+
+
+def shopping_list_fingerprint(user):
+    # Хешируются ровно те строки, что попадают в выгрузку: любое изменение
+    # количества, названия или единицы измерения меняет ETag.
+    digest = hashlib.sha256()
+    rows = 0
+    for row in shopping_list_rows(user).values_list(
+        "ingredient_id", "name", "measurement_unit", "amount"
+    ):
+        digest.update(json.dumps(row, ensure_ascii=False).encode())
+        rows += 1
+    return {"rows": rows, "digest": digest.hexdigest()}
+
+
+def shopping_list_etag(fingerprint, export_format):
+    payload = json.dumps([export_format, fingerprint], sort_keys=True)
+    return 'W/"%s"' % hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def _text_lines(rows):
+    yield "Список покупок:\n"
+    for row in rows:
+        yield f'{row["name"]} ({row["measurement_unit"]}) — {row["amount"]}\n'
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(("Ингредиент", "Единица измерения", "Количество"))
+    for row in rows:
+        writer.writerow((row["name"], row["measurement_unit"], row["amount"]))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _json_lines(rows):
+    separator = "["
+    for row in rows:
+        yield separator + json.dumps(row, ensure_ascii=False)
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+SHOPPING_LIST_FORMATS = {
+    "txt": (_text_lines, "text/plain; charset=utf-8"),
+    "csv": (_csv_lines, "text/csv; charset=utf-8"),
+    "json": (_json_lines, "application/json"),
+}
+
+
+def export_shopping_list(user, export_format):
+    write_lines, content_type = SHOPPING_LIST_FORMATS[export_format]
+    rows = shopping_list_rows(user).iterator()
+    return write_lines(rows), content_type
@@ -1,14 +1,91 @@
-import base64
+import binascii
 import uuid
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 from rest_framework import serializers
 
+IMAGE_SUBTYPES = ("jpeg", "jpg", "png", "gif", "webp")
+DATA_PREFIX = "data:image/"
+BASE64_MARKER = ";base64,"
+HEADER_MAX_LENGTH = 64
+CHUNK_SIZE = 256 * 1024
+
+
+def decoded_size(data, offset):
+    padding = data[-2:].count("=") if len(data) - offset >= 2 else 0
+    return (len(data) - offset) * 3 // 4 - padding
+
+
+def decode_base64(data, offset, target, max_bytes):
+    carry = ""
+    written = 0
+    for start in range(offset, len(data), CHUNK_SIZE):
+        end = start + CHUNK_SIZE
+        chunk = carry + "".join(data[start:end].split())
+        usable = len(chunk) - len(chunk) % 4
+        carry = chunk[usable:]
+        decoded = binascii.a2b_base64(chunk[:usable])
+        written += len(decoded)
+        if written > max_bytes:
+            raise serializers.ValidationError("Изображение слишком большое")
+        target.write(decoded)
+    if carry:
+        raise binascii.Error("Incorrect padding")
+    return written
+
+
+def check_image(file, max_pixels):
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        if width * height > max_pixels:
+            raise serializers.ValidationError("Слишком большое разрешение изображения")
+        image.verify()
+    file.seek(0)
+
+
+def decode_image(data, max_bytes=None, max_pixels=None):
+    max_bytes = max_bytes or settings.IMAGE_UPLOAD_MAX_BYTES
+    max_pixels = max_pixels or settings.IMAGE_UPLOAD_MAX_PIXELS
+    separator = data.find(BASE64_MARKER, 0, HEADER_MAX_LENGTH)
+    if separator == -1:
+        raise serializers.ValidationError("Некорректные данные изображения")
+    subtype_start, offset = len(DATA_PREFIX), separator + len(BASE64_MARKER)
+    subtype = data[subtype_start:separator].lower()
+    if subtype not in IMAGE_SUBTYPES:
+        raise serializers.ValidationError("Неподдерживаемый формат изображения")
+    if decoded_size(data, offset) > max_bytes:
+        raise serializers.ValidationError("Изображение слишком большое")
+
+    file = SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    try:
+        size = decode_base64(data, offset, file, max_bytes)
+        check_image(file, max_pixels)
+    except serializers.ValidationError:
+        file.close()
+        raise
+    except Image.DecompressionBombError:
+        file.close()
+        raise serializers.ValidationError("Слишком большое разрешение изображения")
+    except Exception:
+        file.close()
+        raise serializers.ValidationError(
+            "Загрузите корректное изображение. "
+            "Файл поврежден или не является изображением"
+        )
+    return UploadedFile(
+        file,
+        name=f"{uuid.uuid4()}.{subtype}",
+        content_type=f"image/{subtype}",
+        size=size,
+    )
+
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
-            format, imgstr = data.split(";base64,")
-            ext = format.split("/")[-1]
-            data = ContentFile(base64.b64decode(imgstr), name=f"{uuid.uuid4()}.{ext}")
+            return serializers.FileField.to_internal_value(self, decode_image(data))
         return super().to_internal_value(data)
@@ -1,16 +1,54 @@
+from django import forms
 from django_filters import rest_framework as filters
 
 from foodgram.models import Recipe
+from foodgram.search import recipe_search
+
+
+MAX_ID = 2**63 - 1
+
+
+class IdInFilter(filters.BaseInFilter, filters.NumberFilter):
+    field_class = forms.IntegerField
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("min_value", 1)
+        kwargs.setdefault("max_value", MAX_ID)
+        super().__init__(*args, **kwargs)
 
 
 class RecipeFilter(filters.FilterSet):
     author = filters.NumberFilter(field_name="author__id")
     is_favorited = filters.BooleanFilter(method="filter_is_favorited")
     is_in_shopping_cart = filters.BooleanFilter(method="filter_is_in_shopping_cart")
+    ingredients_all = IdInFilter(method="filter_ingredients")
+    ingredients_any = IdInFilter(method="filter_ingredients")
+    ingredients_none = IdInFilter(method="filter_ingredients")
+    max_cooking_time = filters.NumberFilter(
+        field_name="cooking_time", lookup_expr="lte"
+    )
+    search = filters.CharFilter(method="filter_search")
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ("popular", "Популярные"),
+            ("trending", "Набирающие популярность"),
+        ),
+        method="filter_ordering",
+    )
 
     class Meta:
         model = Recipe
-        fields = ("author", "is_favorited", "is_in_shopping_cart")
+        fields = (
+            "author",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "ingredients_all",
+            "ingredients_any",
+            "ingredients_none",
+            "max_cooking_time",
+            "search",
+            "ordering",
+        )
 
     def filter_is_favorited(self, queryset, name, value):
         user = getattr(self.request, "user", None)
@@ -27,3 +65,23 @@ class RecipeFilter(filters.FilterSet):
             if value:
                 return queryset.filter(in_shopping_cart__user=user)
         return queryset
+
+    def filter_ingredients(self, queryset, name, value):
+        ingredient_ids = {pk for pk in value if pk is not None}
+        if not ingredient_ids:
+            return queryset
+        if name == "ingredients_all":
+            return queryset.with_all_ingredients(ingredient_ids)
+        if name == "ingredients_any":
+            return queryset.with_any_ingredients(ingredient_ids)
+        return queryset.without_ingredients(ingredient_ids)
+
+    def filter_search(self, queryset, name, value):
+        return recipe_search.search(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        if value == "popular":
+            return queryset.order_by("-favorites_count", "-in_carts_count", "-pub_date")
+        if value == "trending":
+            return queryset.order_by("-trending_score", "-pub_date")
+        return queryset
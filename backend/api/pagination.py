@@ -0,0 +1,182 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .utils import MAX_ID
+
+COUNT_EXACT = "exact"
+COUNT_ESTIMATE = "estimate"
+COUNT_NONE = "none"
+COUNT_MODES = (COUNT_EXACT, COUNT_ESTIMATE, COUNT_NONE)
+
+
+def estimate_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def encode_cursor_value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPagination(LimitOffsetPagination):
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    keyset = ("-pk",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.has_next = None
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        count_mode = request.query_params.get(
+            self.count_query_param, COUNT_NONE if self.cursor_mode else COUNT_EXACT
+        )
+        if count_mode not in COUNT_MODES:
+            raise ValidationError(
+                {
+                    self.count_query_param: f"Допустимые значения: {', '.join(COUNT_MODES)}"
+                }
+            )
+        if self.cursor_mode:
+            return self.paginate_keyset(queryset, request, count_mode)
+        if count_mode == COUNT_EXACT:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.count = estimate_count(queryset) if count_mode == COUNT_ESTIMATE else None
+        start, end = self.offset, self.offset + self.limit + 1
+        rows = list(queryset[start:end])
+        self.has_next = len(rows) > self.limit
+        return rows[: self.limit]
+
+    def paginate_keyset(self, queryset, request, count_mode):
+        ordering = tuple(queryset.query.order_by)
+        if ordering and ordering != self.keyset:
+            raise ValidationError(
+                {self.cursor_query_param: "Курсор не поддерживает эту сортировку"}
+            )
+        self.limit = self.get_limit(request) or self.default_limit
+        self.offset = 0
+        if count_mode == COUNT_NONE:
+            self.count = None
+        elif count_mode == COUNT_ESTIMATE:
+            self.count = estimate_count(queryset)
+        else:
+            self.count = self.get_count(queryset)
+
+        queryset = queryset.order_by(*self.keyset)
+        position = self.decode_cursor(queryset.model, request)
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position))
+        rows = list(queryset[: self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        rows = rows[: self.limit]
+        self.next_position = (
+            [getattr(rows[-1], field.lstrip("-")) for field in self.keyset]
+            if self.has_next
+            else None
+        )
+        return rows
+
+    def keyset_filter(self, position):
+        condition = Q()
+        for index, field in enumerate(self.keyset):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {
+                previous.lstrip("-"): value
+                for previous, value in zip(self.keyset[:index], position)
+            }
+            condition |= Q(**equal, **{f"{name}__{lookup}": position[index]})
+        return condition
+
+    def get_field(self, model, field):
+        name = field.lstrip("-")
+        return model._meta.pk if name == "pk" else model._meta.get_field(name)
+
+    def encode_cursor(self, position):
+        payload = json.dumps(position, default=encode_cursor_value).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, model, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if not isinstance(values, list) or len(values) != len(self.keyset):
+                raise ValueError
+            position = []
+            for field, value in zip(self.keyset, values):
+                if isinstance(value, bool) or not isinstance(value, (str, int)):
+                    raise ValueError
+                value = self.get_field(model, field).to_python(value)
+                if value is None:
+                    raise ValueError
+                if isinstance(value, int) and not -MAX_ID <= value <= MAX_ID:
+                    raise ValueError
+                if isinstance(value, datetime) and timezone.is_naive(value):
+                    value = timezone.make_aware(value, timezone.utc)
+                position.append(value)
+            return position
+        except (TypeError, ValueError, binascii.Error, DjangoValidationError):
+            raise NotFound("Неверный курсор")
+
+    def get_next_link(self):
+        if self.cursor_mode:
+            if self.next_position is None:
+                return None
+            url = remove_query_param(
+                self.request.build_absolute_uri(), self.offset_query_param
+            )
+            return replace_query_param(
+                url, self.cursor_query_param, self.encode_cursor(self.next_position)
+            )
+        if self.has_next is None:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(
+            url, self.offset_query_param, self.offset + self.limit
+        )
+
+    def get_previous_link(self):
+        if self.cursor_mode:
+            return None
+        return super().get_previous_link()
+
+
+class RecipePagination(KeysetPagination):
+    keyset = ("-pub_date", "-id")
+
+
+class FeedPagination(KeysetPagination):
+    keyset = ("-pub_date", "-recipe_id")
+
+
+class UserPagination(KeysetPagination):
+    keyset = ("username", "id")
@@ -1,9 +1,30 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
 from .fields import Base64ImageField
-from foodgram.models import Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart
+from .utils import (
+    MAX_ID,
+    get_cart_recipe_ids,
+    get_favorite_recipe_ids,
+    get_followed_author_ids,
+)
+from django.db import transaction
+
+from foodgram import shopping_list
+from foodgram.images import variant_url
+from foodgram.signals import deferred_recipe_touches
+from foodgram.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem,
+)
 from djoser.serializers import UserCreateSerializer, UserSerializer
 
 
@@ -12,6 +33,8 @@ User = get_user_model()
 
 MIN_VALUE = 1
 MAX_VALUE = 32_000
+RECIPES_LIMIT_MAX = 100
+BULK_IDS_MAX = 100
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -48,15 +71,15 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context["request"].user
-        if user.is_anonymous:
-            return False
-        return user.follower.filter(author=obj).exists()
+        annotated = getattr(obj, "is_subscribed", None)
+        if annotated is not None:
+            return annotated
+        return obj.id in get_followed_author_ids(self.context["request"])
 
     def get_avatar(self, obj):
-        if obj.avatar:
-            request = self.context["request"]
-            return request.build_absolute_uri(obj.avatar.url)
+        url = variant_url(obj.avatar, obj.avatar_variants, "thumbnail")
+        if url:
+            return self.context["request"].build_absolute_uri(url)
         return None
 
 
@@ -68,18 +91,65 @@ class RecipeMinifiedSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "image", "cooking_time")
 
     def get_image(self, obj):
-        if obj.image:
-            request = self.context["request"]
-            return request.build_absolute_uri(obj.image.url)
+        url = variant_url(obj.image, obj.image_variants, "thumbnail")
+        if url:
+            return self.context["request"].build_absolute_uri(url)
         return None
 
 
+class RecipeBodySerializer(serializers.ModelSerializer):
+    ingredients = RecipeIngredientSerializer(source="recipe_ingredients", many=True)
+    image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Recipe
+        fields = ("id", "ingredients", "name", "image", "text", "cooking_time")
+
+    def get_image(self, obj):
+        return {
+            variant: variant_url(obj.image, obj.image_variants, variant)
+            for variant in ("medium", "full")
+        }
+
+
+def recipe_body_key(recipe):
+    return f"foodgram:recipe-body:{recipe.id}:{recipe.updated_at.timestamp()}"
+
+
+def get_recipe_bodies(recipes):
+    keys = {recipe.id: recipe_body_key(recipe) for recipe in recipes}
+    cached = cache.get_many(keys.values())
+    bodies = {pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = [recipe for recipe in recipes if recipe.id not in bodies]
+    if missing:
+        prefetch_related_objects(
+            missing,
+            Prefetch(
+                "recipe_ingredients",
+                queryset=RecipeIngredient.objects.select_related("ingredient"),
+            ),
+        )
+        fresh = {recipe.id: RecipeBodySerializer(recipe).data for recipe in missing}
+        cache.set_many(
+            {keys[pk]: body for pk, body in fresh.items()},
+            settings.RECIPE_BODY_CACHE_TTL,
+        )
+        bodies.update(fresh)
+    return bodies
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        self.child.bodies = get_recipe_bodies(recipes)
+        return super().to_representation(recipes)
+
+
 class RecipeSerializer(serializers.ModelSerializer):
+    # Ответ собирается в to_representation из кешированного тела рецепта.
     author = serializers.SerializerMethodField()
-    ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -94,29 +164,52 @@ class RecipeSerializer(serializers.ModelSerializer):
             "text",
             "cooking_time",
         )
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        bodies = getattr(self, "bodies", {})
+        if instance.id not in bodies:
+            bodies = get_recipe_bodies([instance])
+        body = bodies[instance.id]
+        return {
+            "id": body["id"],
+            "author": self.get_author(instance),
+            "ingredients": body["ingredients"],
+            "is_favorited": self.get_is_favorited(instance),
+            "is_in_shopping_cart": self.get_is_in_shopping_cart(instance),
+            "name": body["name"],
+            "image": self.build_image_url(body["image"][self.image_variant]),
+            "text": body["text"],
+            "cooking_time": body["cooking_time"],
+        }
 
-    def get_author(self, obj):
-        return CustomUserSerializer(obj.author, context=self.context).data
+    @property
+    def image_variant(self):
+        return (
+            "medium" if isinstance(self.parent, serializers.ListSerializer) else "full"
+        )
 
-    def get_ingredients(self, obj):
-        return RecipeIngredientSerializer(obj.recipe_ingredients.all(), many=True).data
+    def get_author(self, obj):
+        author = obj.author
+        if hasattr(obj, "author_is_subscribed"):
+            author.is_subscribed = obj.author_is_subscribed
+        return CustomUserSerializer(author, context=self.context).data
 
     def get_is_favorited(self, obj):
-        user = self.context["request"].user
-        if user.is_anonymous:
-            return False
-        return obj.favorited_by.filter(user=user).exists()
+        annotated = getattr(obj, "is_favorited", None)
+        if annotated is not None:
+            return annotated
+        return obj.id in get_favorite_recipe_ids(self.context["request"])
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context["request"].user
-        if user.is_anonymous:
-            return False
-        return obj.in_shopping_cart.filter(user=user).exists()
-
-    def get_image(self, obj):
-        if obj.image:
-            request = self.context["request"]
-            return request.build_absolute_uri(obj.image.url)
+        annotated = getattr(obj, "is_in_shopping_cart", None)
+        if annotated is not None:
+            return annotated
+        return obj.id in get_cart_recipe_ids(self.context["request"])
+
+    def build_image_url(self, url):
+        if url:
+            return self.context["request"].build_absolute_uri(url)
         return None
 
 
@@ -193,11 +286,38 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         self.create_recipe_ingredients(recipe, ingredients_data)
         return recipe
 
+    def update_recipe_ingredients(self, recipe, ingredients_data):
+        amounts = {item["id"]: item["amount"] for item in ingredients_data}
+        current = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        old_amounts = {pk: row.amount for pk, row in current.items()}
+        removed = current.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=amount)
+            for pk, amount in amounts.items()
+            if pk not in current
+        )
+        changed = []
+        for pk, row in current.items():
+            if pk in amounts and row.amount != amounts[pk]:
+                row.amount = amounts[pk]
+                changed.append(row)
+        RecipeIngredient.objects.bulk_update(changed, ["amount"])
+        shopping_list.change_recipe(recipe.id, old_amounts, amounts)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         if "ingredients" in validated_data:
-            ingredients_data = validated_data.pop("ingredients")
-            instance.ingredients.clear()
-            self.create_recipe_ingredients(instance, ingredients_data)
+            with deferred_recipe_touches():
+                self.update_recipe_ingredients(
+                    instance, validated_data.pop("ingredients")
+                )
         return super().update(instance, validated_data)
 
 
@@ -227,6 +347,17 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         ]
 
 
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source="ingredient.id")
+    name = serializers.ReadOnlyField(source="ingredient.name")
+    measurement_unit = serializers.ReadOnlyField(source="ingredient.measurement_unit")
+    amount = serializers.ReadOnlyField(source="total_amount")
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ("id", "name", "measurement_unit", "amount")
+
+
 class CustomUserCreateSerializer(UserCreateSerializer):
     class Meta:
         model = User
@@ -241,23 +372,33 @@ class CustomUserCreateSerializer(UserCreateSerializer):
 
 class SubscribeSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(CustomUserSerializer.Meta):
         fields = CustomUserSerializer.Meta.fields + ("recipes", "recipes_count")
 
     def get_recipes(self, obj):
         request = self.context["request"]
-        recipes = obj.recipes.all()
-        recipes_limit = request.query_params.get("recipes_limit")
-        if recipes_limit:
-            recipes = recipes[: int(recipes_limit)]
+        recipes = getattr(obj, "recipe_previews", None)
+        if recipes is None:
+            recipes_limit = self.context.get("recipes_limit", RECIPES_LIMIT_MAX)
+            recipes = obj.recipes.all()[:recipes_limit]
         return RecipeMinifiedSerializer(
             recipes, many=True, context={"request": request}
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+
+class RecipesLimitSerializer(serializers.Serializer):
+    recipes_limit = serializers.IntegerField(
+        min_value=0,
+        max_value=RECIPES_LIMIT_MAX,
+        default=RECIPES_LIMIT_MAX,
+        error_messages={
+            "invalid": "Параметр recipes_limit должен быть целым числом",
+            "min_value": "Параметр recipes_limit не может быть отрицательным",
+            "max_value": f"Параметр recipes_limit должен быть не более {RECIPES_LIMIT_MAX}",
+        },
+    )
 
 
 class SetPasswordSerializer(serializers.Serializer):
@@ -271,3 +412,34 @@ class SetAvatarSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ("avatar",)
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=MAX_ID),
+        allow_empty=False,
+        max_length=BULK_IDS_MAX,
+        error_messages={
+            "empty": "Список идентификаторов не может быть пустым",
+            "max_length": f"Не более {BULK_IDS_MAX} идентификаторов за запрос",
+        },
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
+class PantryMatchSerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.PANTRY_MAX_INGREDIENTS,
+        error_messages={
+            "empty": "Укажите хотя бы один ингредиент",
+            "max_length": f"Не более {settings.PANTRY_MAX_INGREDIENTS} ингредиентов",
+        },
+    )
+    min_coverage = serializers.FloatField(min_value=0, max_value=1, default=0)
+
+    def validate_ingredients(self, value):
+        return list(dict.fromkeys(value))
@@ -0,0 +1,242 @@
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from foodgram import feed, shopping_list, trending
+from foodgram.counters import adjust_counters
+from foodgram.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow
+
+User = get_user_model()
+
+ADDED = "added"
+REMOVED = "removed"
+EXISTS = "exists"
+MISSING = "missing"
+NOT_FOUND = "not_found"
+SELF = "self"
+
+
+def returning_clause(model, returning):
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in returning]
+    return ", ".join(quote(field.column) for field in fields), fields
+
+
+def convert_rows(fields, rows):
+    # Сырой курсор отдаёт значения как есть (на SQLite даты — строками),
+    # поэтому применяются те же конвертеры, что и в ORM.
+    columns = []
+    for field in fields:
+        column = field.get_col(field.model._meta.db_table)
+        converters = connection.ops.get_db_converters(column) + field.get_db_converters(
+            connection
+        )
+        columns.append((column, converters))
+    converted = []
+    for row in rows:
+        values = []
+        for value, (column, converters) in zip(row, columns):
+            for converter in converters:
+                value = converter(value, column, connection)
+            values.append(value)
+        converted.append(tuple(values))
+    return converted
+
+
+def insert_ignore(model, rows, returning):
+    if not rows:
+        return []
+    fields = [model._meta.get_field(name) for name in rows[0]]
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(field.column) for field in fields)
+    placeholders = ", ".join(
+        "(%s)" % ", ".join(["%s"] * len(fields)) for _ in range(len(rows))
+    )
+    params = [
+        field.get_db_prep_value(row[field.name], connection)
+        for row in rows
+        for field in fields
+    ]
+    returned, returned_fields = returning_clause(model, returning)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(model._meta.db_table)} ({columns}) "
+            f"VALUES {placeholders} ON CONFLICT DO NOTHING RETURNING {returned}",
+            params,
+        )
+        return convert_rows(returned_fields, cursor.fetchall())
+
+
+def delete_returning(model, user_id, target_field, target_ids, returning):
+    if not target_ids:
+        return []
+    quote = connection.ops.quote_name
+    user_field = model._meta.get_field("user")
+    target = model._meta.get_field(target_field)
+    placeholders = ", ".join(["%s"] * len(target_ids))
+    returned, returned_fields = returning_clause(model, returning)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(model._meta.db_table)} "
+            f"WHERE {quote(user_field.column)} = %s "
+            f"AND {quote(target.column)} IN ({placeholders}) "
+            f"RETURNING {returned}",
+            [user_field.get_db_prep_value(user_id, connection)]
+            + [target.get_db_prep_value(pk, connection) for pk in target_ids],
+        )
+        return convert_rows(returned_fields, cursor.fetchall())
+
+
+class RelationToggle:
+    model = None
+    target_model = None
+    target_field = None
+
+    def add(self, user_id, target_id):
+        return bool(self.add_many(user_id, [target_id]))
+
+    def remove(self, user_id, target_id):
+        return bool(self.remove_many(user_id, [target_id]))
+
+    def make_row(self, user_id, target_id):
+        return {"user": user_id, self.target_field: target_id}
+
+    def add_many(self, user_id, target_ids):
+        rows = [self.make_row(user_id, pk) for pk in target_ids]
+        with transaction.atomic():
+            returned = insert_ignore(self.model, rows, self.returning)
+            if returned:
+                self.on_rows_added(user_id, returned)
+        return [row[0] for row in returned]
+
+    def remove_many(self, user_id, target_ids):
+        with transaction.atomic():
+            returned = delete_returning(
+                self.model, user_id, self.target_field, target_ids, self.returning
+            )
+            if returned:
+                self.on_rows_removed(user_id, returned)
+        return [row[0] for row in returned]
+
+    @property
+    def returning(self):
+        return (self.target_field,)
+
+    def on_rows_added(self, user_id, rows):
+        self.on_added(user_id, [row[0] for row in rows])
+
+    def on_rows_removed(self, user_id, rows):
+        self.on_removed(user_id, [row[0] for row in rows])
+
+    def lookup(self, user_id, target_ids):
+        links = self.model.objects.filter(
+            user_id=user_id, **{self.target_field: OuterRef("pk")}
+        )
+        return dict(
+            self.target_model.objects.filter(pk__in=target_ids)
+            .order_by()
+            .values_list("pk", Exists(links))
+        )
+
+    def bulk_add(self, user_id, target_ids):
+        with transaction.atomic():
+            linked = self.lookup(user_id, target_ids)
+            added = set(
+                self.add_many(
+                    user_id, [pk for pk in target_ids if linked.get(pk) is False]
+                )
+            )
+        return {
+            pk: NOT_FOUND if pk not in linked else ADDED if pk in added else EXISTS
+            for pk in target_ids
+        }
+
+    def bulk_remove(self, user_id, target_ids):
+        with transaction.atomic():
+            linked = self.lookup(user_id, target_ids)
+            removed = set(
+                self.remove_many(user_id, [pk for pk in target_ids if linked.get(pk)])
+            )
+        return {
+            pk: NOT_FOUND if pk not in linked else REMOVED if pk in removed else MISSING
+            for pk in target_ids
+        }
+
+    def on_added(self, user_id, target_ids):
+        pass
+
+    def on_removed(self, user_id, target_ids):
+        pass
+
+
+class RecipeToggle(RelationToggle):
+    target_model = Recipe
+    target_field = "recipe"
+    trending_weight = 0.0
+
+    def make_row(self, user_id, target_id):
+        row = super().make_row(user_id, target_id)
+        row["created_at"] = timezone.now()
+        return row
+
+    returning = ("recipe", "created_at")
+
+    def on_rows_added(self, user_id, rows):
+        super().on_rows_added(user_id, rows)
+        trending.record(rows, self.trending_weight)
+
+    def on_rows_removed(self, user_id, rows):
+        super().on_rows_removed(user_id, rows)
+        # Вычитается ровно тот вклад, что был добавлен при создании связи.
+        trending.record(rows, -self.trending_weight)
+
+
+class FavoriteToggle(RecipeToggle):
+    model = Favorite
+    trending_weight = trending.FAVORITE_WEIGHT
+
+    def on_added(self, user_id, target_ids):
+        adjust_counters(Recipe.objects.filter(pk__in=target_ids), favorites_count=1)
+
+    def on_removed(self, user_id, target_ids):
+        adjust_counters(Recipe.objects.filter(pk__in=target_ids), favorites_count=-1)
+
+
+class ShoppingCartToggle(RecipeToggle):
+    model = ShoppingCart
+    trending_weight = trending.CART_WEIGHT
+
+    def on_added(self, user_id, target_ids):
+        shopping_list.add_recipes(user_id, target_ids)
+        adjust_counters(Recipe.objects.filter(pk__in=target_ids), in_carts_count=1)
+
+    def on_removed(self, user_id, target_ids):
+        shopping_list.remove_recipes(user_id, target_ids)
+        adjust_counters(Recipe.objects.filter(pk__in=target_ids), in_carts_count=-1)
+
+
+class FollowToggle(RelationToggle):
+    model = Follow
+    target_model = User
+    target_field = "author"
+
+    def bulk_add(self, user_id, target_ids):
+        results = super().bulk_add(user_id, [pk for pk in target_ids if pk != user_id])
+        if user_id in target_ids:
+            results[user_id] = SELF
+        return results
+
+    def on_added(self, user_id, target_ids):
+        adjust_counters(User.objects.filter(pk__in=target_ids), followers_count=1)
+        feed.backfill(user_id, target_ids)
+
+    def on_removed(self, user_id, target_ids):
+        adjust_counters(User.objects.filter(pk__in=target_ids), followers_count=-1)
+        feed.remove(user_id, target_ids)
+
+
+favorites = FavoriteToggle()
+shopping_cart = ShoppingCartToggle()
+follows = FollowToggle()
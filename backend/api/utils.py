@@ -0,0 +1,61 @@
+import hashlib
+import json
+from collections import defaultdict
+
+from foodgram.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow
+
+# Верхняя граница BigAutoField: большие id не доходят до базы.
+MAX_ID = 2**63 - 1
+
+
+def get_user_id_set(request, attribute, queryset, field):
+    user = request.user
+    if user.is_anonymous:
+        return frozenset()
+    cached = getattr(request, attribute, None)
+    if cached is None:
+        cached = frozenset(queryset.filter(user=user).values_list(field, flat=True))
+        setattr(request, attribute, cached)
+    return cached
+
+
+def get_followed_author_ids(request):
+    return get_user_id_set(request, "_followed_author_ids", Follow.objects, "author_id")
+
+
+def get_favorite_recipe_ids(request):
+    return get_user_id_set(
+        request, "_favorite_recipe_ids", Favorite.objects, "recipe_id"
+    )
+
+
+def get_cart_recipe_ids(request):
+    return get_user_id_set(
+        request, "_cart_recipe_ids", ShoppingCart.objects, "recipe_id"
+    )
+
+
+def attach_recipe_previews(authors, limit):
+    previews = defaultdict(list)
+    author_ids = [author.id for author in authors]
+    for recipe in Recipe.objects.latest_per_author(author_ids, limit):
+        previews[recipe.author_id].append(recipe)
+    for author in authors:
+        author.recipe_previews = previews[author.id]
+    return authors
+
+
+def recipe_etag(recipes, *extra):
+    state = [
+        (
+            recipe.id,
+            recipe.updated_at.isoformat(),
+            getattr(recipe, "is_favorited", None),
+            getattr(recipe, "is_in_shopping_cart", None),
+            getattr(recipe, "author_is_subscribed", None),
+        )
+        for recipe in recipes
+    ]
+    payload = json.dumps([extra, state], default=str)
+    return 'W/"%s"' % hashlib.sha256(payload.encode()).hexdigest()[:32]
@@ -1,9 +1,26 @@
+from functools import partial
+
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
+from django.conf import settings
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
-from foodgram.models import Recipe, Ingredient, Favorite, ShoppingCart, RecipeIngredient
+from foodgram.models import Recipe, Ingredient
+from foodgram.pantry import pantry_index
+from foodgram.feed import entries_for
+from . import services
+from foodgram.catalogue import get_ingredient_catalogue
+from foodgram.response_cache import recipe_responses
+from foodgram.search import SEARCH_MODES, ingredient_search
 from .serializers import (
     RecipeSerializer,
     RecipeCreateSerializer,
@@ -12,25 +29,48 @@ from .serializers import (
     CustomUserSerializer,
     CustomUserCreateSerializer,
     SubscribeSerializer,
+    RecipesLimitSerializer,
+    BulkIdsSerializer,
+    PantryMatchSerializer,
     SetPasswordSerializer,
     SetAvatarSerializer,
+    ShoppingListItemSerializer,
 )
 from django_filters.rest_framework import DjangoFilterBackend
+from .exports import (
+    SHOPPING_LIST_RENDERERS,
+    export_shopping_list,
+    shopping_list_etag,
+    shopping_list_fingerprint,
+)
 from .filters import RecipeFilter
+from .pagination import FeedPagination, RecipePagination, UserPagination
 from .permissions import IsAuthorOrReadOnly
-from users.models import Follow
+from .utils import attach_recipe_previews, recipe_etag
 from djoser.views import UserViewSet as DjoserUserViewSet
-from django.db import models
+from django.db import transaction
 
 
 User = get_user_model()
 
 
+def bulk_toggle(request, toggle):
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = serializer.validated_data["ids"]
+    if request.method == "POST":
+        results = toggle.bulk_add(request.user.id, ids)
+    else:
+        results = toggle.bulk_remove(request.user.id, ids)
+    return Response({"results": [{"id": pk, "status": results[pk]} for pk in ids]})
+
+
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
 
     def get_serializer_class(self):
         if self.action in ("create", "partial_update"):
@@ -39,6 +79,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeMinifiedSerializer
         return RecipeSerializer
 
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -69,32 +110,109 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.save()
 
     def get_queryset(self):
-        return Recipe.objects.all()
+        return Recipe.objects.select_related("author").with_user_flags(
+            self.request.user
+        )
 
-    @action(
-        detail=True,
-        methods=["post", "delete"],
-        permission_classes=[permissions.IsAuthenticated],
-    )
-    def favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        user = request.user
+    def conditional_response(self, request, etag, last_modified, build_response):
+        if request.user.is_authenticated:
+            last_modified = None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = build_response()
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ("Authorization",))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return recipe_responses.fetch(request, partial(self.render_list, request))
+
+    def render_list(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            recipes = list(queryset)
+            etag = recipe_etag(recipes)
+        else:
+            recipes = page
+            etag = recipe_etag(
+                recipes,
+                getattr(self.paginator, "count", None),
+                self.paginator.get_next_link(),
+            )
+
+        def build_response():
+            serializer = self.get_serializer(recipes, many=True)
+            if page is None:
+                return Response(serializer.data)
+            return self.get_paginated_response(serializer.data)
+
+        return self.conditional_response(request, etag, None, build_response)
+
+    def retrieve(self, request, *args, **kwargs):
+        return recipe_responses.fetch(request, partial(self.render_detail, request))
+
+    def render_detail(self, request):
+        recipe = self.get_object()
+        return self.conditional_response(
+            request,
+            recipe_etag([recipe]),
+            int(recipe.updated_at.timestamp()),
+            lambda: Response(self.get_serializer(recipe).data),
+        )
+
+    def toggle_recipe(self, request, pk, toggle, exists_error, missing_error):
         if request.method == "POST":
-            if recipe.favorited_by.filter(user=user).exists():
+            recipe = get_object_or_404(Recipe, pk=pk)
+            if not toggle.add(request.user.id, recipe.id):
                 return Response(
-                    {"errors": "Рецепт уже в избранном"},
-                    status=status.HTTP_400_BAD_REQUEST,
+                    {"errors": exists_error}, status=status.HTTP_400_BAD_REQUEST
                 )
-            Favorite.objects.create(user=user, recipe=recipe)
             serializer = RecipeMinifiedSerializer(recipe, context={"request": request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        fav = recipe.favorited_by.filter(user=user)
-        if fav.exists():
-            fav.delete()
+        if toggle.remove(request.user.id, pk):
             return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(
-            {"errors": "Рецепта не было в избранном"},
-            status=status.HTTP_400_BAD_REQUEST,
+        get_object_or_404(Recipe, pk=pk)
+        return Response({"errors": missing_error}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="favorite/bulk",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def favorite_bulk(self, request):
+        return bulk_toggle(request, services.favorites)
+
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="shopping_cart/bulk",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def shopping_cart_bulk(self, request):
+        return bulk_toggle(request, services.shopping_cart)
+
+    @action(
+        detail=True,
+        methods=["post", "delete"],
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def favorite(self, request, pk=None):
+        return self.toggle_recipe(
+            request,
+            pk,
+            services.favorites,
+            "Рецепт уже в избранном",
+            "Рецепта не было в избранном",
         )
 
     @action(
@@ -103,63 +221,120 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[permissions.IsAuthenticated],
     )
     def shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        user = request.user
-        if request.method == "POST":
-            if recipe.in_shopping_cart.filter(user=user).exists():
-                return Response(
-                    {"errors": "Рецепт уже в корзине"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            ShoppingCart.objects.create(user=user, recipe=recipe)
-            serializer = RecipeMinifiedSerializer(recipe, context={"request": request})
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        cart = recipe.in_shopping_cart.filter(user=user)
-        if cart.exists():
-            cart.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(
-            {"errors": "Рецепта не было в корзине"}, status=status.HTTP_400_BAD_REQUEST
+        return self.toggle_recipe(
+            request,
+            pk,
+            services.shopping_cart,
+            "Рецепт уже в корзине",
+            "Рецепта не было в корзине",
         )
 
     @action(
-        detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated]
+        detail=False,
+        methods=["get"],
+        permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=SHOPPING_LIST_RENDERERS,
     )
     def download_shopping_cart(self, request):
-        user = request.user
-        cart_items = user.shopping_cart.all()
-        if not cart_items.exists():
+        fingerprint = shopping_list_fingerprint(request.user)
+        if not fingerprint["rows"]:
             return Response(
                 {"errors": "Ваш список покупок пуст"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__in=cart_items.values_list("recipe", flat=True)
+        export_format = request.accepted_renderer.format
+        etag = shopping_list_etag(fingerprint, export_format)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            content, content_type = export_shopping_list(request.user, export_format)
+            response = StreamingHttpResponse(content, content_type=content_type)
+            response["Content-Disposition"] = (
+                f'attachment; filename="shopping_list.{export_format}"'
             )
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(amount=models.Sum("amount"))
-            .order_by("ingredient__name")
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @action(
+        detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated]
+    )
+    def shopping_list(self, request):
+        items = request.user.shopping_list_items.select_related("ingredient").order_by(
+            "ingredient__name", "ingredient__measurement_unit"
         )
+        return Response(ShoppingListItemSerializer(items, many=True).data)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[permissions.IsAuthenticated],
+        pagination_class=FeedPagination,
+    )
+    def feed(self, request):
+        page = self.paginate_queryset(entries_for(request.user))
+        recipes = self.get_queryset().in_bulk([entry.recipe_id for entry in page])
+        recipes = [
+            recipes[entry.recipe_id] for entry in page if entry.recipe_id in recipes
+        ]
+        serializer = RecipeSerializer(recipes, many=True, context={"request": request})
+        return self.get_paginated_response(serializer.data)
 
-        shopping_list = ["Список покупок:\n"]
-        for ingredient in ingredients:
-            shopping_list.append(
-                f'{ingredient["ingredient__name"]} ({ingredient["ingredient__measurement_unit"]}) — '
-                f'{ingredient["amount"]}\n'
+    @action(detail=False, methods=["get"], pagination_class=LimitOffsetPagination)
+    def match(self, request):
+        serializer = PantryMatchSerializer(
+            data={
+                "ingredients": [
+                    part
+                    for value in request.query_params.getlist("ingredients")
+                    for part in value.split(",")
+                    if part
+                ],
+                "min_coverage": request.query_params.get("min_coverage", 0),
+            }
+        )
+        serializer.is_valid(raise_exception=True)
+        ingredient_ids = serializer.validated_data["ingredients"]
+        matches = self.paginate_queryset(
+            pantry_index.match(
+                ingredient_ids, serializer.validated_data["min_coverage"]
             )
+        )
+        coverage = {recipe_id: value for recipe_id, value, _ in matches}
+        recipes = self.get_queryset().in_bulk(list(coverage))
+        recipes = [recipes[pk] for pk in coverage if pk in recipes]
+        missing = pantry_index.missing(coverage, ingredient_ids)
+        ingredients = Ingredient.objects.in_bulk(
+            {pk for recipe in recipes for pk in missing[recipe.id]}
+        )
+        data = RecipeSerializer(recipes, many=True, context={"request": request}).data
+        for recipe in data:
+            recipe["coverage"] = round(coverage[recipe["id"]], 4)
+            recipe["missing_ingredients"] = IngredientSerializer(
+                [ingredients[pk] for pk in missing[recipe["id"]] if pk in ingredients],
+                many=True,
+            ).data
+        return self.get_paginated_response(data)
 
-        response = Response(shopping_list)
-        response["Content-Type"] = "text/plain"
-        response["Content-Disposition"] = 'attachment; filename="shopping_list.txt"'
-        return response
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="cache-stats",
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def cache_stats(self, request):
+        return Response(recipe_responses.stats())
 
     @action(detail=True, methods=["get"], url_path="get-link")
     def get_link(self, request, pk=None):
         recipe = self.get_object()
         url = f"http://{request.get_host()}/recipes/{recipe.id}/"
-        return Response({"short-link": url})
+        return self.conditional_response(
+            request,
+            recipe_etag([recipe], url),
+            int(recipe.updated_at.timestamp()),
+            lambda: Response({"short-link": url}),
+        )
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -167,18 +342,43 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     pagination_class = None
 
-    def get_queryset(self):
-        queryset = Ingredient.objects.all()
-        name = self.request.query_params.get("name")
-        if name:
-            queryset = queryset.filter(name__istartswith=name)
-        return queryset
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get("name")
+        if not name:
+            return self.catalogue(request)
+        mode = request.query_params.get("match", "prefix")
+        if mode not in SEARCH_MODES:
+            return Response(
+                {"match": [f"Допустимые значения: {', '.join(SEARCH_MODES)}"]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ingredients = ingredient_search.search(name, mode)
+        return Response(self.get_serializer(ingredients, many=True).data)
+
+    def catalogue(self, request):
+        version, body = get_ingredient_catalogue()
+        etag = f'"{version}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        if request.GET.get("version") == version:
+            patch_cache_control(response, public=True, max_age=31536000, immutable=True)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=settings.INGREDIENT_CATALOGUE_MAX_AGE
+            )
+        return response
 
 
 class CustomUserViewSet(DjoserUserViewSet):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = UserPagination
+
+    def get_queryset(self):
+        return super().get_queryset().with_subscription_flag(self.request.user)
 
     def get_serializer_class(self):
         if self.action == "create":
@@ -236,18 +436,43 @@ class CustomUserViewSet(DjoserUserViewSet):
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             serializer.save()
             return Response(serializer.data)
-        request.user.avatar.delete(save=True)
+        # Файлы хранятся по хешу содержимого и могут быть общими: только
+        # снимаем ссылку, удаляет неиспользуемые файлы collect_media.
+        request.user.avatar = None
+        request.user.avatar_variants = {}
+        request.user.save(update_fields=["avatar", "avatar_variants"])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated]
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(following__user=request.user)
-        page = self.paginate_queryset(queryset)
-        serializer = SubscribeSerializer(page, many=True, context={"request": request})
+        recipes_limit = self.get_recipes_limit(request)
+        queryset = User.objects.filter(
+            following__user=request.user
+        ).with_subscription_flag(request.user)
+        page = attach_recipe_previews(self.paginate_queryset(queryset), recipes_limit)
+        serializer = SubscribeSerializer(
+            page,
+            many=True,
+            context={"request": request, "recipes_limit": recipes_limit},
+        )
         return self.get_paginated_response(serializer.data)
 
+    def get_recipes_limit(self, request):
+        serializer = RecipesLimitSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data["recipes_limit"]
+
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="subscribe/bulk",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def subscribe_bulk(self, request):
+        return bulk_toggle(request, services.follows)
+
     @action(
         detail=True,
         methods=["post", "delete"],
@@ -255,25 +480,27 @@ class CustomUserViewSet(DjoserUserViewSet):
     )
     def subscribe(self, request, id=None):
         user = request.user
-        author = get_object_or_404(User, id=id)
         if request.method == "POST":
+            author = get_object_or_404(User, id=id)
             if user == author:
                 return Response(
                     {"errors": "Нельзя подписаться на самого себя"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            if user.follower.filter(author=author).exists():
+            recipes_limit = self.get_recipes_limit(request)
+            if not services.follows.add(user.id, author.id):
                 return Response(
                     {"errors": "Вы уже подписаны на этого пользователя"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            Follow.objects.create(user=user, author=author)
-            serializer = SubscribeSerializer(author, context={"request": request})
+            author.is_subscribed = True
+            serializer = SubscribeSerializer(
+                author, context={"request": request, "recipes_limit": recipes_limit}
+            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        follow = user.follower.filter(author=author)
-        if follow.exists():
-            follow.delete()
+        if services.follows.remove(user.id, id):
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(User, id=id)
         return Response(
             {"errors": "Вы не подписаны на этого пользователя"},
             status=status.HTTP_400_BAD_REQUEST,
@@ -5,6 +5,7 @@ set -e
 python manage.py makemigrations
 python manage.py migrate
 python manage.py init_data
+python manage.py recompute_trending
 python manage.py collectstatic --noinput
 python manage.py test --keepdb
 
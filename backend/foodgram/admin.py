@@ -1,5 +1,15 @@
 from django.contrib import admin
-from .models import Recipe, Ingredient, RecipeIngredient, Favorite, ShoppingCart
+from .models import (
+    Recipe,
+    Ingredient,
+    RecipeIngredient,
+    Favorite,
+    ShoppingCart,
+    ShoppingListItem,
+    MediaFile,
+    DataImport,
+)
+from .signals import deferred_recipe_touches
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -9,15 +19,21 @@ class RecipeIngredientInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ("name", "author", "cooking_time", "favorites_count")
+    list_display = (
+        "name",
+        "author",
+        "cooking_time",
+        "favorites_count",
+        "in_carts_count",
+    )
     list_filter = ("author", "name")
+    list_select_related = ("author",)
     search_fields = ("name", "author__username", "author__email")
     inlines = [RecipeIngredientInline]
 
-    def favorites_count(self, obj):
-        return obj.favorited_by.count()
-
-    favorites_count.short_description = "Favorites"
+    def save_related(self, request, form, formsets, change):
+        with deferred_recipe_touches():
+            super().save_related(request, form, formsets, change)
 
 
 @admin.register(Ingredient)
@@ -39,3 +55,23 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ("user", "recipe")
     search_fields = ("user__username", "recipe__name")
     list_filter = ("user",)
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ("user", "ingredient", "total_amount")
+    search_fields = ("user__username", "ingredient__name")
+    list_select_related = ("user", "ingredient")
+
+
+@admin.register(MediaFile)
+class MediaFileAdmin(admin.ModelAdmin):
+    list_display = ("name", "refcount", "updated_at")
+    search_fields = ("name",)
+    readonly_fields = ("name", "refcount", "updated_at")
+
+
+@admin.register(DataImport)
+class DataImportAdmin(admin.ModelAdmin):
+    list_display = ("source", "rows", "imported_at")
+    readonly_fields = ("source", "checksum", "rows", "imported_at")
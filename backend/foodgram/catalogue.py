@@ -0,0 +1,28 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from .models import Ingredient
+
+CATALOGUE_CACHE_KEY = "foodgram:ingredient-catalogue"
+
+
+def build_ingredient_catalogue():
+    body = JSONRenderer().render(
+        list(Ingredient.objects.values("id", "name", "measurement_unit"))
+    )
+    return hashlib.sha256(body).hexdigest()[:32], body
+
+
+def get_ingredient_catalogue():
+    catalogue = cache.get(CATALOGUE_CACHE_KEY)
+    if catalogue is None:
+        catalogue = build_ingredient_catalogue()
+        cache.set(CATALOGUE_CACHE_KEY, catalogue, settings.INGREDIENT_INDEX_TTL)
+    return catalogue
+
+
+def invalidate_ingredient_catalogue():
+    cache.delete(CATALOGUE_CACHE_KEY)
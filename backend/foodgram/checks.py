@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.checks import Error, register
+from django.utils import timezone
+
+# 2 ** 1024 уже не помещается во float; запас в 24 периода оставлен
+# на сумму вкладов одного рецепта, ещё 100 — на перенос TRENDING_EPOCH.
+TRENDING_MAX_HALF_LIVES = 1000
+TRENDING_HEADROOM_HALF_LIVES = 100
+
+
+@register()
+def check_trending_horizon(app_configs, **kwargs):
+    from .trending import epoch
+
+    half_life = settings.TRENDING_HALF_LIFE_HOURS
+    if half_life <= 0:
+        return [
+            Error(
+                "TRENDING_HALF_LIFE_HOURS должен быть положительным",
+                id="foodgram.E001",
+            )
+        ]
+    horizon = epoch() + timedelta(hours=half_life * TRENDING_MAX_HALF_LIVES)
+    headroom = timedelta(hours=half_life * TRENDING_HEADROOM_HALF_LIVES)
+    if horizon < timezone.now() + headroom:
+        return [
+            Error(
+                "Рейтинг trending переполнится "
+                f"{horizon:%Y-%m-%d}: при периоде полураспада "
+                f"{half_life:g} ч отсчёт TRENDING_EPOCH устарел",
+                hint="Перенесите TRENDING_EPOCH ближе к текущей дате "
+                "и выполните recompute_trending",
+                id="foodgram.E002",
+            )
+        ]
+    return []
@@ -0,0 +1,11 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+
+def adjust_counters(queryset, **deltas):
+    return queryset.update(
+        **{
+            field: Greatest(F(field) + delta, 0) if delta < 0 else F(field) + delta
+            for field, delta in deltas.items()
+        }
+    )
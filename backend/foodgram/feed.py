@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from users.models import Follow
+
+from .models import FeedEntry, Recipe
+
+User = get_user_model()
+
+
+def _insert_recipes(user_column, condition, params, join_follows=False):
+    quote = connection.ops.quote_name
+    recipe = quote(Recipe._meta.db_table)
+    follow = quote(Follow._meta.db_table)
+    join = (
+        f"JOIN {follow} ON {follow}.{quote('author_id')} = {recipe}.{quote('author_id')}"
+        if join_follows
+        else ""
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(FeedEntry._meta.db_table)} "
+            f"({quote('user_id')}, {quote('recipe_id')}, {quote('author_id')}, "
+            f"{quote('pub_date')}) "
+            f"SELECT {user_column}, {recipe}.{quote('id')}, "
+            f"{recipe}.{quote('author_id')}, {recipe}.{quote('pub_date')} "
+            f"FROM {recipe} {join} WHERE {condition} ON CONFLICT DO NOTHING",
+            params,
+        )
+
+
+def fan_out(recipe):
+    # Решение о рассылке сохраняется в рецепте: нерасосланный рецепт
+    # подмешивается в ленты при чтении, даже если у автора потом станет
+    # меньше подписчиков.
+    if not User.objects.filter(
+        pk=recipe.author_id,
+        followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).exists():
+        return
+    quote = connection.ops.quote_name
+    _insert_recipes(
+        f"{quote(Follow._meta.db_table)}.{quote('user_id')}",
+        f"{quote(Recipe._meta.db_table)}.{quote('id')} = %s",
+        [recipe.pk],
+        join_follows=True,
+    )
+    Recipe.objects.filter(pk=recipe.pk).update(fanned_out=True)
+
+
+def backfill(user_id, author_ids):
+    if not author_ids:
+        return
+    quote = connection.ops.quote_name
+    placeholders = ", ".join(["%s"] * len(author_ids))
+    _insert_recipes(
+        "%s",
+        f"{quote(Recipe._meta.db_table)}.{quote('author_id')} IN ({placeholders})",
+        [user_id, *author_ids],
+    )
+
+
+def pull(user_id):
+    quote = connection.ops.quote_name
+    follow = quote(Follow._meta.db_table)
+    _insert_recipes(
+        f"{follow}.{quote('user_id')}",
+        f"{follow}.{quote('user_id')} = %s "
+        f"AND NOT {quote(Recipe._meta.db_table)}.{quote('fanned_out')}",
+        [user_id],
+        join_follows=True,
+    )
+
+
+def remove(user_id, author_ids):
+    FeedEntry.objects.filter(user_id=user_id, author_id__in=author_ids).delete()
+
+
+def entries_for(user):
+    # Перед выдачей нерасосланные рецепты дописываются в ленту читателя,
+    # и страница всегда читается по индексу (user, -pub_date, -recipe).
+    pull(user.pk)
+    return FeedEntry.objects.filter(user=user).order_by("-pub_date", "-recipe_id")
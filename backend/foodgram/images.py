@@ -0,0 +1,145 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from . import media
+from .models import Recipe
+from .response_cache import recipe_responses
+
+logger = logging.getLogger(__name__)
+
+VARIANT_SIZES = {
+    "thumbnail": (320, 320),
+    "medium": (800, 800),
+    "full": (1600, 1600),
+}
+RECIPE_VARIANTS = ("thumbnail", "medium", "full")
+AVATAR_VARIANTS = ("thumbnail",)
+SOURCE_KEY = "source"
+
+_executor = None
+
+
+def variant_format():
+    return "WEBP" if features.check("webp") else "JPEG"
+
+
+def variant_name(name, variant, image_format):
+    directory, filename = os.path.split(name)
+    root = os.path.splitext(filename)[0]
+    return f"{directory}/variants/{root}.{variant}.{image_format.lower()}"
+
+
+def referenced_files(name, variants):
+    names = {value for key, value in variants.items() if key != SOURCE_KEY}
+    if name:
+        names.add(name)
+    return names
+
+
+def render_variant(image, size, image_format):
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    if image_format == "JPEG" and variant.mode not in ("RGB", "L"):
+        variant = variant.convert("RGB")
+    buffer = io.BytesIO()
+    variant.save(buffer, image_format, quality=settings.IMAGE_VARIANT_QUALITY)
+    return buffer.getvalue()
+
+
+def build_variants(field_file, variants):
+    storage = field_file.storage
+    image_format = variant_format()
+    with storage.open(field_file.name, "rb") as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    built = {SOURCE_KEY: field_file.name}
+    for variant in variants:
+        name = storage.save(
+            variant_name(field_file.name, variant, image_format),
+            ContentFile(render_variant(image, VARIANT_SIZES[variant], image_format)),
+        )
+        built[variant] = name
+    return built
+
+
+def variant_url(field_file, variants, variant):
+    if not field_file:
+        return None
+    if variants.get(SOURCE_KEY) == field_file.name and variant in variants:
+        return field_file.storage.url(variants[variant])
+    return field_file.url
+
+
+def needs_variants(field_file, variants):
+    return bool(field_file) and variants.get(SOURCE_KEY) != field_file.name
+
+
+def replace_variants(old, new):
+    old, new = referenced_files(None, old), referenced_files(None, new)
+    media.retain(new - old)
+    media.release(old - new)
+
+
+def process_recipe_image(recipe_id, name):
+    recipe = Recipe.objects.filter(pk=recipe_id, image=name).first()
+    if recipe is None:
+        return
+    variants = build_variants(recipe.image, RECIPE_VARIANTS)
+    if Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_variants=variants, updated_at=timezone.now()
+    ):
+        replace_variants(recipe.image_variants, variants)
+        recipe_responses.invalidate()
+
+
+def process_avatar(user_id, name):
+    User = get_user_model()
+    user = User.objects.filter(pk=user_id, avatar=name).first()
+    if user is None:
+        return
+    variants = build_variants(user.avatar, AVATAR_VARIANTS)
+    if User.objects.filter(pk=user_id, avatar=name).update(avatar_variants=variants):
+        replace_variants(user.avatar_variants, variants)
+        Recipe.objects.filter(author_id=user_id).update(updated_at=timezone.now())
+        recipe_responses.invalidate()
+
+
+def run_task(task, *args):
+    try:
+        task(*args)
+    except Exception:
+        logger.exception("Не удалось обработать изображение %s", args)
+
+
+def _run_in_worker(task, *args):
+    try:
+        run_task(task, *args)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS, thread_name_prefix="images"
+        )
+    return _executor
+
+
+def schedule(task, *args):
+    if settings.IMAGE_PROCESSING == "sync":
+        transaction.on_commit(lambda: run_task(task, *args))
+    else:
+        transaction.on_commit(
+            lambda: get_executor().submit(_run_in_worker, task, *args)
+        )
@@ -0,0 +1,105 @@
+import base64
+import io
+import multiprocessing
+import os
+import resource
+import time
+
+from django import forms
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from api.fields import decode_image
+
+MIB = 1024 * 1024
+
+
+def make_payload(size):
+    side = int((size / 3) ** 0.5)
+    image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", compress_level=1)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f"data:image/png;base64,{encoded}"
+
+
+def legacy_decode(data):
+    _, imgstr = data.split(";base64,")
+    content = ContentFile(base64.b64decode(imgstr), name="image.png")
+    forms.ImageField().clean(content)
+
+
+def streaming_decode(data):
+    decode_image(data, max_bytes=len(data), max_pixels=Image.MAX_IMAGE_PIXELS).close()
+
+
+DECODERS = {"before": legacy_decode, "after": streaming_decode}
+
+
+def read_status(field):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field):
+                return int(line.split()[1])
+    raise OSError(field)
+
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return read_status("VmRSS:")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def peak_rss():
+    try:
+        return read_status("VmHWM:")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(decoder, size, results):
+    payload = make_payload(size)
+    baseline = reset_peak_rss()
+    started = time.perf_counter()
+    DECODERS[decoder](payload)
+    elapsed = time.perf_counter() - started
+    results.put(((peak_rss() - baseline) / 1024, elapsed))
+
+
+class Command(BaseCommand):
+    help = "Пиковое потребление памяти при декодировании base64-изображений"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[1, 5, 10],
+            help="Размеры изображений в мегабайтах",
+        )
+
+    def run(self, decoder, size):
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        process = context.Process(target=measure, args=(decoder, size, results))
+        process.start()
+        result = results.get()
+        process.join()
+        return result
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'МБ':>4} {'до, МБ RSS':>12} {'после, МБ RSS':>14} "
+            f"{'до, с':>8} {'после, с':>9}"
+        )
+        for size in options["sizes"]:
+            before_rss, before_time = self.run("before", size * MIB)
+            after_rss, after_time = self.run("after", size * MIB)
+            self.stdout.write(
+                f"{size:>4} {before_rss:>12.1f} {after_rss:>14.1f} "
+                f"{before_time:>8.3f} {after_time:>9.3f}"
+            )
@@ -0,0 +1,134 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from foodgram.models import Ingredient, Recipe, RecipeIngredient
+
+User = get_user_model()
+
+
+def chained_all(queryset, ingredient_ids):
+    for ingredient_id in ingredient_ids:
+        queryset = queryset.filter(recipe_ingredients__ingredient_id=ingredient_id)
+    return queryset
+
+
+def chained_any(queryset, ingredient_ids):
+    return queryset.filter(
+        recipe_ingredients__ingredient_id__in=ingredient_ids
+    ).distinct()
+
+
+def chained_none(queryset, ingredient_ids):
+    for ingredient_id in ingredient_ids:
+        queryset = queryset.exclude(recipe_ingredients__ingredient_id=ingredient_id)
+    return queryset
+
+
+CASES = (
+    ("all", chained_all, Recipe.objects.with_all_ingredients),
+    ("any", chained_any, Recipe.objects.with_any_ingredients),
+    ("none", chained_none, Recipe.objects.without_ingredients),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнение фильтров рецептов по ингредиентам на синтетических данных "
+        "(данные создаются в транзакции и откатываются)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=100_000)
+        parser.add_argument("--ingredients", type=int, default=2000)
+        parser.add_argument("--per-recipe", type=int, default=8)
+        parser.add_argument("--query-size", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            started = time.perf_counter()
+            ingredient_ids = self.seed(options)
+            self.stdout.write(
+                f"Создано рецептов: {options['recipes']} "
+                f"за {time.perf_counter() - started:.1f} с"
+            )
+            query = ingredient_ids[: options["query_size"]]
+            self.stdout.write(
+                f"{'фильтр':<6} {'рецептов':>9} {'JOIN, мс':>10} {'подзапрос, мс':>14}"
+            )
+            for name, chained, set_based in CASES:
+                rows, chained_time = self.measure(
+                    lambda: chained(Recipe.objects.all(), query), options["repeat"]
+                )
+                set_rows, set_time = self.measure(
+                    lambda: set_based(query), options["repeat"]
+                )
+                if rows != set_rows:
+                    self.stderr.write(
+                        f"{name}: результаты расходятся ({rows} != {set_rows})"
+                    )
+                self.stdout.write(
+                    f"{name:<6} {set_rows:>9} {chained_time:>10.1f} {set_time:>14.1f}"
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, options):
+        rng = random.Random(options["seed"])
+        author = User.objects.create(username="bench-ingredient-filters")
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"bench-ingredient-{index}", measurement_unit="г")
+            for index in range(options["ingredients"])
+        )
+        ingredient_ids = list(
+            Ingredient.objects.filter(name__startswith="bench-ingredient-")
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=author,
+                    name=f"Рецепт {index}",
+                    text="Текст",
+                    cooking_time=rng.randint(1, 180),
+                )
+                for index in range(options["recipes"])
+            ),
+            batch_size=1000,
+        )
+        recipe_ids = Recipe.objects.filter(author=author).values_list("pk", flat=True)
+        per_recipe = min(options["per_recipe"], len(ingredient_ids))
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id, amount=1
+                )
+                for recipe_id in recipe_ids.iterator()
+                for ingredient_id in self.pick(rng, ingredient_ids, per_recipe)
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        return ingredient_ids
+
+    def pick(self, rng, ingredient_ids, count):
+        # Популярность ингредиентов убывает квадратично: первые встречаются
+        # почти в каждом рецепте, хвост — редко.
+        picked = set()
+        while len(picked) < count:
+            picked.add(ingredient_ids[int(len(ingredient_ids) * rng.random() ** 2)])
+        return picked
+
+    def measure(self, build_queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = build_queryset().count()
+            timings.append((time.perf_counter() - started) * 1000)
+        return rows, min(timings)
@@ -0,0 +1,79 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from foodgram.images import referenced_files
+from foodgram.models import MediaFile, Recipe
+
+User = get_user_model()
+
+MEDIA_FIELDS = (
+    (Recipe, "image", "image_variants"),
+    (User, "avatar", "avatar_variants"),
+)
+
+
+class Command(BaseCommand):
+    help = "Удаление медиафайлов, на которые не осталось ссылок"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recount",
+            action="store_true",
+            help="Пересчитать ссылки по рецептам и пользователям перед удалением",
+        )
+        parser.add_argument(
+            "--grace-minutes",
+            type=int,
+            default=settings.MEDIA_GC_GRACE_MINUTES,
+            help="Не трогать файлы, освобождённые позже этого срока",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, что будет удалено",
+        )
+
+    def handle(self, *args, **options):
+        if options["recount"]:
+            self.stdout.write(f"Исправлено счётчиков ссылок: {self.recount()}")
+        cutoff = timezone.now() - timedelta(minutes=options["grace_minutes"])
+        orphans = MediaFile.objects.filter(refcount=0, updated_at__lt=cutoff)
+        removed = 0
+        for orphan in orphans.iterator():
+            if options["dry_run"]:
+                self.stdout.write(orphan.name)
+            elif MediaFile.objects.filter(pk=orphan.pk, refcount=0).delete()[0]:
+                default_storage.delete(orphan.name)
+            else:
+                continue
+            removed += 1
+        verb = "Будет удалено" if options["dry_run"] else "Удалено"
+        self.stdout.write(self.style.SUCCESS(f"{verb} файлов: {removed}"))
+
+    @transaction.atomic
+    def recount(self):
+        references = Counter()
+        for model, file_field, variants_field in MEDIA_FIELDS:
+            rows = model.objects.values_list(file_field, variants_field).iterator()
+            for name, variants in rows:
+                references.update(referenced_files(name, variants))
+        MediaFile.objects.bulk_create(
+            (MediaFile(name=name) for name in references), ignore_conflicts=True
+        )
+        drifted = []
+        now = timezone.now()
+        for media_file in MediaFile.objects.select_for_update().iterator():
+            expected = references.get(media_file.name, 0)
+            if media_file.refcount != expected:
+                media_file.refcount = expected
+                media_file.updated_at = now
+                drifted.append(media_file)
+        MediaFile.objects.bulk_update(drifted, ["refcount", "updated_at"])
+        return len(drifted)
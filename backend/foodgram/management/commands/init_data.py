@@ -1,33 +1,128 @@
+import csv
+import hashlib
 import json
 import os
-from django.core.management.base import BaseCommand
-from foodgram.models import Ingredient
+import time
+from itertools import islice
 
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
-class Command(BaseCommand):
-    help = "Загрузка ингредиентов из JSON файла"
+from foodgram.catalogue import invalidate_ingredient_catalogue
+from foodgram.models import DataImport, Ingredient
+from foodgram.search import ingredient_search
 
-    def handle(self, *args, **options):
+SOURCE = "ingredients"
+READ_SIZE = 64 * 1024
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(READ_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_json(file):
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith("["):
+        raise CommandError("Ожидался JSON-массив ингредиентов")
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
         try:
-            file_path = "/app/data/ingredients.json"
-            if not os.path.exists(file_path):
-                self.stdout.write(self.style.ERROR(f"Файл не найден: {file_path}"))
-                return
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError("Файл JSON оборван или повреждён")
+            buffer += chunk
+            continue
+        yield item["name"], item["measurement_unit"]
+        buffer = buffer[end:]
+
 
-            with open(file_path, "r", encoding="utf-8") as file:
-                ingredients = json.load(file)
+def iter_csv(file):
+    for row in csv.reader(file):
+        if not row or row == ["name", "measurement_unit"]:
+            continue
+        if len(row) != 2:
+            raise CommandError(f"Некорректная строка CSV: {row}")
+        yield row[0], row[1]
 
-            self.stdout.write(f"Найдено {len(ingredients)} ингредиентов для загрузки")
 
-            for ingredient in ingredients:
-                Ingredient.objects.get_or_create(
-                    name=ingredient["name"],
-                    measurement_unit=ingredient["measurement_unit"],
-                )
+READERS = {".json": iter_json, ".csv": iter_csv}
+
+
+class Command(BaseCommand):
+    help = "Загрузка ингредиентов из JSON или CSV файла"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default=settings.INGREDIENTS_DATA_PATH,
+            help="Путь к ingredients.json или ingredients.csv",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Загрузить даже если файл не изменился",
+        )
+
+    def handle(self, *args, **options):
+        path = str(options["path"])
+        if not os.path.exists(path):
+            self.stdout.write(self.style.ERROR(f"Файл не найден: {path}"))
+            return
+        read_rows = READERS.get(os.path.splitext(path)[1].lower())
+        if read_rows is None:
+            raise CommandError("Поддерживаются только файлы .json и .csv")
+
+        started = time.perf_counter()
+        checksum = file_checksum(path)
+        previous = DataImport.objects.filter(source=SOURCE).first()
+        if (
+            not options["force"]
+            and previous is not None
+            and previous.checksum == checksum
+            and Ingredient.objects.count() >= previous.rows
+        ):
+            self.stdout.write(
+                f"Файл не изменился, пропускаем загрузку ({previous.rows} строк)"
+            )
+            return
 
-            self.stdout.write(self.style.SUCCESS("Все ингредиенты загружены"))
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Ошибка: {str(e)}"))
-            import traceback
+        with transaction.atomic():
+            before = Ingredient.objects.count()
+            total = 0
+            with open(path, encoding="utf-8", newline="") as file:
+                rows = read_rows(file)
+                while True:
+                    batch = [
+                        Ingredient(name=name.strip(), measurement_unit=unit.strip())
+                        for name, unit in islice(rows, options["batch_size"])
+                    ]
+                    if not batch:
+                        break
+                    Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                    total += len(batch)
+            added = Ingredient.objects.count() - before
+            DataImport.objects.update_or_create(
+                source=SOURCE, defaults={"checksum": checksum, "rows": total}
+            )
+            transaction.on_commit(ingredient_search.invalidate)
+            transaction.on_commit(invalidate_ingredient_catalogue)
 
-            self.stdout.write(traceback.format_exc())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Прочитано строк: {total}, добавлено ингредиентов: {added} "
+                f"за {time.perf_counter() - started:.2f} с"
+            )
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from foodgram.models import Recipe
+from foodgram.search import recipe_search
+
+
+class Command(BaseCommand):
+    help = "Пересборка поискового индекса рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.order_by("pk").values_list("pk", flat=True))
+        batch_size = options["batch_size"]
+        for start in range(0, len(recipe_ids), batch_size):
+            end = start + batch_size
+            recipe_search.index(recipe_ids[start:end])
+        self.stdout.write(
+            self.style.SUCCESS(f"Проиндексировано рецептов: {len(recipe_ids)}")
+        )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodgram.shopping_list import expected_items, rebuild, stored_items
+
+
+class Command(BaseCommand):
+    help = "Пересборка и проверка агрегированных списков покупок"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только проверить расхождения, ничего не изменяя",
+        )
+
+    def handle(self, *args, **options):
+        drifted = self.find_drifted_users()
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Списки покупок согласованы"))
+            return
+        self.stdout.write(f"Расхождения у пользователей: {len(drifted)}")
+        if options["check"]:
+            raise CommandError("Агрегат списков покупок рассинхронизирован")
+
+        with transaction.atomic():
+            rebuild(drifted)
+        if self.find_drifted_users(drifted):
+            raise CommandError("Не удалось пересобрать списки покупок")
+        self.stdout.write(self.style.SUCCESS("Списки покупок пересобраны"))
+
+    def find_drifted_users(self, user_ids=None):
+        expected = expected_items(user_ids)
+        stored = stored_items(user_ids)
+        return sorted(
+            {
+                user_id
+                for user_id, ingredient_id in expected.keys() | stored.keys()
+                if expected.get((user_id, ingredient_id))
+                != stored.get((user_id, ingredient_id))
+            }
+        )
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from foodgram.trending import recompute
+
+
+class Command(BaseCommand):
+    help = "Пересчёт рейтинга набирающих популярность рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            type=int,
+            metavar="SECONDS",
+            help="Повторять пересчёт с указанным интервалом",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            changed = recompute()
+            self.stdout.write(
+                f"Обновлено рейтингов: {changed} "
+                f"за {time.perf_counter() - started:.2f} с"
+            )
+            if not options["loop"]:
+                return
+            close_old_connections()
+            time.sleep(options["loop"])
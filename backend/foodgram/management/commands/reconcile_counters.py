@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from foodgram.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, "favorites_count", Favorite, "recipe_id"),
+    (Recipe, "in_carts_count", ShoppingCart, "recipe_id"),
+    (User, "recipes_count", Recipe, "author_id"),
+    (User, "followers_count", Follow, "author_id"),
+)
+
+
+class Command(BaseCommand):
+    help = "Сверка и исправление денормализованных счётчиков"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только проверить расхождения, ничего не изменяя",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        with transaction.atomic():
+            for model, field, related_model, key in COUNTERS:
+                drifted = self.reconcile(
+                    model, field, related_model, key, options["check"]
+                )
+                if drifted:
+                    self.stdout.write(
+                        f"{model.__name__}.{field}: расхождений {drifted}"
+                    )
+                total += drifted
+        if not total:
+            self.stdout.write(self.style.SUCCESS("Счётчики согласованы"))
+        elif options["check"]:
+            raise CommandError(f"Рассинхронизировано счётчиков: {total}")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Исправлено счётчиков: {total}"))
+
+    def reconcile(self, model, field, related_model, key, check):
+        actual = dict(
+            related_model.objects.order_by()
+            .values_list(key)
+            .annotate(total=Count("pk"))
+            .values_list(key, "total")
+        )
+        drifted = []
+        for obj in model.objects.only("pk", field).iterator():
+            expected = actual.get(obj.pk, 0)
+            if getattr(obj, field) != expected:
+                setattr(obj, field, expected)
+                drifted.append(obj)
+        if not check:
+            model.objects.bulk_update(drifted, [field], batch_size=500)
+        return len(drifted)
@@ -0,0 +1,26 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import MediaFile
+
+
+def retain(names):
+    names = sorted(set(filter(None, names)))
+    if not names:
+        return
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=name) for name in names), ignore_conflicts=True
+    )
+    MediaFile.objects.filter(name__in=names).update(
+        refcount=F("refcount") + 1, updated_at=timezone.now()
+    )
+
+
+def release(names):
+    names = sorted(set(filter(None, names)))
+    if not names:
+        return
+    MediaFile.objects.filter(name__in=names).update(
+        refcount=Greatest(F("refcount") - 1, 0), updated_at=timezone.now()
+    )
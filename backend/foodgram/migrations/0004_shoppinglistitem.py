@@ -0,0 +1,241 @@
+# Generated by Django 3.2.3 on 2026-10-17 03:57
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("foodgram", "0003_ingredient_name_trgm_index"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="favorite",
+            options={
+                "ordering": ["-recipe__pub_date"],
+                "verbose_name": "Избранное",
+                "verbose_name_plural": "Избранное",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="ingredient",
+            options={
+                "ordering": ["name"],
+                "verbose_name": "Ингредиент",
+                "verbose_name_plural": "Ингредиенты",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="recipe",
+            options={
+                "ordering": ["-pub_date"],
+                "verbose_name": "Рецепт",
+                "verbose_name_plural": "Рецепты",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="recipeingredient",
+            options={
+                "ordering": ["recipe", "ingredient"],
+                "verbose_name": "Ингредиент рецепта",
+                "verbose_name_plural": "Ингредиенты рецепта",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="shoppingcart",
+            options={
+                "ordering": ["-recipe__pub_date"],
+                "verbose_name": "Список покупок",
+                "verbose_name_plural": "Списки покупок",
+            },
+        ),
+        migrations.AlterField(
+            model_name="favorite",
+            name="recipe",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="favorited_by",
+                to="foodgram.recipe",
+                verbose_name="Рецепт",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="favorite",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="favorites",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Пользователь",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="ingredient",
+            name="measurement_unit",
+            field=models.CharField(max_length=200, verbose_name="Единица измерения"),
+        ),
+        migrations.AlterField(
+            model_name="ingredient",
+            name="name",
+            field=models.CharField(max_length=200, verbose_name="Название"),
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="author",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="recipes",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Автор",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="cooking_time",
+            field=models.PositiveSmallIntegerField(
+                validators=[
+                    django.core.validators.MinValueValidator(
+                        1, message="Время приготовления должно быть не менее 1 минут"
+                    ),
+                    django.core.validators.MaxValueValidator(
+                        32000,
+                        message="Время приготовления должно быть не более 32000 минут",
+                    ),
+                ],
+                verbose_name="Время приготовления в минутах",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="image",
+            field=models.ImageField(
+                upload_to="foodgram/images/", verbose_name="Изображение"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="ingredients",
+            field=models.ManyToManyField(
+                through="foodgram.RecipeIngredient",
+                to="foodgram.Ingredient",
+                verbose_name="Ингредиенты",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="name",
+            field=models.CharField(max_length=200, verbose_name="Название"),
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="pub_date",
+            field=models.DateTimeField(
+                auto_now_add=True, verbose_name="Дата публикации"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="text",
+            field=models.TextField(verbose_name="Описание"),
+        ),
+        migrations.AlterField(
+            model_name="recipeingredient",
+            name="amount",
+            field=models.PositiveSmallIntegerField(
+                validators=[
+                    django.core.validators.MinValueValidator(
+                        1, message="Количество ингредиента должно быть не менее 1"
+                    ),
+                    django.core.validators.MaxValueValidator(
+                        32000,
+                        message="Количество ингредиента должно быть не более 32000",
+                    ),
+                ],
+                verbose_name="Количество",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipeingredient",
+            name="ingredient",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                to="foodgram.ingredient",
+                verbose_name="Ингредиент",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipeingredient",
+            name="recipe",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="recipe_ingredients",
+                to="foodgram.recipe",
+                verbose_name="Рецепт",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="shoppingcart",
+            name="recipe",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="in_shopping_cart",
+                to="foodgram.recipe",
+                verbose_name="Рецепт",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="shoppingcart",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="shopping_cart",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Пользователь",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ShoppingListItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "total_amount",
+                    models.PositiveIntegerField(verbose_name="Общее количество"),
+                ),
+                (
+                    "ingredient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="foodgram.ingredient",
+                        verbose_name="Ингредиент",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shopping_list_items",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Позиция списка покупок",
+                "verbose_name_plural": "Позиции списка покупок",
+                "unique_together": {("user", "ingredient")},
+            },
+        ),
+    ]
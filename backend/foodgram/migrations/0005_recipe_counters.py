@@ -0,0 +1,61 @@
+# Generated by Django 3.2.3 on 2026-10-17 03:58
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(model, field):
+    rows = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model("foodgram", "Recipe")
+    Favorite = apps.get_model("foodgram", "Favorite")
+    ShoppingCart = apps.get_model("foodgram", "ShoppingCart")
+    CustomUser = apps.get_model("users", "CustomUser")
+    Recipe.objects.update(
+        favorites_count=count_related(Favorite, "recipe"),
+        in_carts_count=count_related(ShoppingCart, "recipe"),
+    )
+    CustomUser.objects.update(recipes_count=count_related(Recipe, "author"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foodgram", "0004_shoppinglistitem"),
+        ("users", "0003_customuser_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="В избранном"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="in_carts_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="В списках покупок"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["-favorites_count", "-in_carts_count", "-pub_date"],
+                name="recipe_popular_idx",
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 3.2.3 on 2026-10-17 04:22
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    Recipe = apps.get_model("foodgram", "Recipe")
+    CustomUser = apps.get_model("users", "CustomUser")
+    MediaFile = apps.get_model("foodgram", "MediaFile")
+    references = Counter()
+    for model, file_field, variants_field in (
+        (Recipe, "image", "image_variants"),
+        (CustomUser, "avatar", "avatar_variants"),
+    ):
+        rows = model.objects.values_list(file_field, variants_field).iterator()
+        for name, variants in rows:
+            if name:
+                references[name] += 1
+            references.update(
+                value for key, value in variants.items() if key != "source"
+            )
+    MediaFile.objects.bulk_create(
+        MediaFile(name=name, refcount=count) for name, count in references.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foodgram", "0009_recipe_image_variants"),
+        ("users", "0005_customuser_avatar_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaFile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(max_length=255, unique=True, verbose_name="Файл"),
+                ),
+                (
+                    "refcount",
+                    models.PositiveIntegerField(default=0, verbose_name="Ссылок"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата изменения"),
+                ),
+            ],
+            options={
+                "verbose_name": "Медиафайл",
+                "verbose_name_plural": "Медиафайлы",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="mediafile",
+            index=models.Index(
+                fields=["refcount", "updated_at"], name="mediafile_gc_idx"
+            ),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.3 on 2026-10-17 04:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foodgram", "0010_mediafile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataImport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="Источник"
+                    ),
+                ),
+                (
+                    "checksum",
+                    models.CharField(max_length=64, verbose_name="Контрольная сумма"),
+                ),
+                ("rows", models.PositiveIntegerField(default=0, verbose_name="Строк")),
+                (
+                    "imported_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата загрузки"),
+                ),
+            ],
+            options={
+                "verbose_name": "Загрузка данных",
+                "verbose_name_plural": "Загрузки данных",
+            },
+        ),
+    ]
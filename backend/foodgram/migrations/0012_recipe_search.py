@@ -0,0 +1,148 @@
+# Generated by Django 3.2.3 on 2026-10-17 04:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+POSTGRES_FORWARD = (
+    "ALTER TABLE foodgram_recipesearchdocument ADD COLUMN vector tsvector",
+    """
+    CREATE FUNCTION foodgram_recipe_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.ingredients, '')), 'B')
+            || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "CREATE TRIGGER recipe_search_vector_update "
+    "BEFORE INSERT OR UPDATE ON foodgram_recipesearchdocument "
+    "FOR EACH ROW EXECUTE FUNCTION foodgram_recipe_search_vector()",
+    "CREATE INDEX recipe_search_vector_idx "
+    "ON foodgram_recipesearchdocument USING gin (vector)",
+)
+POSTGRES_BACKWARD = (
+    "DROP TRIGGER IF EXISTS recipe_search_vector_update "
+    "ON foodgram_recipesearchdocument",
+    "DROP FUNCTION IF EXISTS foodgram_recipe_search_vector()",
+)
+SQLITE_FORWARD = (
+    "CREATE VIRTUAL TABLE foodgram_recipesearch_fts USING fts5("
+    "name, ingredients, text, content='foodgram_recipesearchdocument', "
+    "content_rowid='recipe_id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER recipe_search_fts_insert "
+    "AFTER INSERT ON foodgram_recipesearchdocument BEGIN "
+    "INSERT INTO foodgram_recipesearch_fts(rowid, name, ingredients, text) "
+    "VALUES (new.recipe_id, new.name, new.ingredients, new.text); END",
+    "CREATE TRIGGER recipe_search_fts_delete "
+    "AFTER DELETE ON foodgram_recipesearchdocument BEGIN "
+    "INSERT INTO foodgram_recipesearch_fts"
+    "(foodgram_recipesearch_fts, rowid, name, ingredients, text) "
+    "VALUES ('delete', old.recipe_id, old.name, old.ingredients, old.text); END",
+    "CREATE TRIGGER recipe_search_fts_update "
+    "AFTER UPDATE ON foodgram_recipesearchdocument BEGIN "
+    "INSERT INTO foodgram_recipesearch_fts"
+    "(foodgram_recipesearch_fts, rowid, name, ingredients, text) "
+    "VALUES ('delete', old.recipe_id, old.name, old.ingredients, old.text); "
+    "INSERT INTO foodgram_recipesearch_fts(rowid, name, ingredients, text) "
+    "VALUES (new.recipe_id, new.name, new.ingredients, new.text); END",
+)
+SQLITE_BACKWARD = (
+    "DROP TRIGGER IF EXISTS recipe_search_fts_insert",
+    "DROP TRIGGER IF EXISTS recipe_search_fts_delete",
+    "DROP TRIGGER IF EXISTS recipe_search_fts_update",
+    "DROP TABLE IF EXISTS foodgram_recipesearch_fts",
+)
+
+
+def sqlite_has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return "ENABLE_FTS5" in {row[0] for row in cursor.fetchall()}
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        statements = POSTGRES_FORWARD
+    elif vendor == "sqlite" and sqlite_has_fts5(schema_editor.connection):
+        statements = SQLITE_FORWARD
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        statements = POSTGRES_BACKWARD
+    elif vendor == "sqlite":
+        statements = SQLITE_BACKWARD
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def index_recipes(apps, schema_editor):
+    Recipe = apps.get_model("foodgram", "Recipe")
+    RecipeIngredient = apps.get_model("foodgram", "RecipeIngredient")
+    RecipeSearchDocument = apps.get_model("foodgram", "RecipeSearchDocument")
+    ingredients = {}
+    rows = RecipeIngredient.objects.order_by("recipe_id", "ingredient__name")
+    for recipe_id, name in rows.values_list("recipe_id", "ingredient__name"):
+        ingredients.setdefault(recipe_id, []).append(name)
+    RecipeSearchDocument.objects.bulk_create(
+        (
+            RecipeSearchDocument(
+                recipe_id=recipe_id,
+                name=name,
+                ingredients=", ".join(ingredients.get(recipe_id, ())),
+                text=text,
+            )
+            for recipe_id, name, text in Recipe.objects.values_list(
+                "id", "name", "text"
+            ).iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foodgram", "0011_dataimport"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipeSearchDocument",
+            fields=[
+                (
+                    "recipe",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="foodgram.recipe",
+                        verbose_name="Рецепт",
+                    ),
+                ),
+                ("name", models.CharField(max_length=200, verbose_name="Название")),
+                (
+                    "ingredients",
+                    models.TextField(blank=True, verbose_name="Ингредиенты"),
+                ),
+                ("text", models.TextField(verbose_name="Описание")),
+            ],
+            options={
+                "verbose_name": "Поисковый документ рецепта",
+                "verbose_name_plural": "Поисковые документы рецептов",
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(index_recipes, migrations.RunPython.noop),
+    ]
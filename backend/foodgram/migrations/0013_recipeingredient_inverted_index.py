@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-17 04:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foodgram", "0012_recipe_search"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipeingredient",
+            index=models.Index(
+                fields=["ingredient", "recipe"], name="recipeingredient_inverted_idx"
+            ),
+        ),
+    ]
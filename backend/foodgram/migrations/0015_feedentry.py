@@ -0,0 +1,94 @@
+# Generated by Django 3.2.3 on 2026-10-17 04:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_feeds(apps, schema_editor):
+    Follow = apps.get_model("users", "Follow")
+    CustomUser = apps.get_model("users", "CustomUser")
+    Recipe = apps.get_model("foodgram", "Recipe")
+    FeedEntry = apps.get_model("foodgram", "FeedEntry")
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f"INSERT INTO {quote(FeedEntry._meta.db_table)} (user_id, recipe_id, author_id) "
+        f"SELECT follow.user_id, recipe.id, recipe.author_id "
+        f"FROM {quote(Follow._meta.db_table)} follow "
+        f"JOIN {quote(Recipe._meta.db_table)} recipe "
+        "ON recipe.author_id = follow.author_id "
+        f"JOIN {quote(CustomUser._meta.db_table)} author "
+        "ON author.id = follow.author_id "
+        "WHERE author.followers_count <= %s",
+        [settings.FEED_FANOUT_MAX_FOLLOWERS],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("foodgram", "0014_recipe_updated_index"),
+        ("users", "0005_customuser_avatar_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Автор",
+                    ),
+                ),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_entries",
+                        to="foodgram.recipe",
+                        verbose_name="Рецепт",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_entries",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Подписчик",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Запись ленты",
+                "verbose_name_plural": "Записи ленты",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="feedentry",
+            index=models.Index(
+                fields=["user", "author"], name="feedentry_user_author_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="feedentry",
+            constraint=models.UniqueConstraint(
+                fields=("user", "recipe"), name="unique_feed_entry"
+            ),
+        ),
+        migrations.RunPython(backfill_feeds, migrations.RunPython.noop),
+    ]
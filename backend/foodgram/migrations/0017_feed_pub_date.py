@@ -0,0 +1,83 @@
+# Generated by Django 3.2.3 on 2026-10-17 05:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_pub_dates(apps, schema_editor):
+    Recipe = apps.get_model("foodgram", "Recipe")
+    FeedEntry = apps.get_model("foodgram", "FeedEntry")
+    FeedEntry.objects.update(
+        pub_date=Subquery(
+            Recipe.objects.filter(pk=OuterRef("recipe_id")).values("pub_date")[:1]
+        )
+    )
+
+
+def refill_feeds(apps, schema_editor):
+    Follow = apps.get_model("users", "Follow")
+    CustomUser = apps.get_model("users", "CustomUser")
+    Recipe = apps.get_model("foodgram", "Recipe")
+    FeedEntry = apps.get_model("foodgram", "FeedEntry")
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f"INSERT INTO {quote(FeedEntry._meta.db_table)} "
+        "(user_id, recipe_id, author_id, pub_date) "
+        f"SELECT follow.user_id, recipe.id, recipe.author_id, recipe.pub_date "
+        f"FROM {quote(Follow._meta.db_table)} follow "
+        f"JOIN {quote(Recipe._meta.db_table)} recipe "
+        "ON recipe.author_id = follow.author_id "
+        f"JOIN {quote(CustomUser._meta.db_table)} author "
+        "ON author.id = follow.author_id "
+        "WHERE author.followers_count <= %s "
+        "ON CONFLICT DO NOTHING",
+        [settings.FEED_FANOUT_MAX_FOLLOWERS],
+    )
+    Recipe.objects.filter(
+        author__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).update(fanned_out=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foodgram", "0016_trending_score"),
+        ("users", "0005_customuser_avatar_variants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feedentry",
+            name="pub_date",
+            field=models.DateTimeField(null=True, verbose_name="Дата публикации"),
+        ),
+        migrations.RunPython(copy_pub_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="feedentry",
+            name="pub_date",
+            field=models.DateTimeField(verbose_name="Дата публикации"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="fanned_out",
+            field=models.BooleanField(
+                default=False, editable=False, verbose_name="Разослан по лентам"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="feedentry",
+            index=models.Index(
+                fields=["user", "-pub_date", "-recipe"], name="feedentry_user_pub_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                condition=models.Q(fanned_out=False),
+                fields=["author"],
+                name="recipe_pulled_idx",
+            ),
+        ),
+        migrations.RunPython(refill_feeds, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,10 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from users.models import Follow
 
 User = get_user_model()
 
@@ -24,12 +28,81 @@ class Ingredient(models.Model):
         return f"{self.name} ({self.measurement_unit})"
 
 
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        if user is None or not user.is_authenticated:
+            false = models.Value(False, output_field=models.BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                author_is_subscribed=false,
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                Favorite.objects.filter(user=user, recipe=models.OuterRef("pk"))
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCart.objects.filter(user=user, recipe=models.OuterRef("pk"))
+            ),
+            author_is_subscribed=models.Exists(
+                Follow.objects.filter(user=user, author=models.OuterRef("author"))
+            ),
+        )
+
+    def recipes_with_ingredients(self, ingredient_ids):
+        return (
+            RecipeIngredient.objects.filter(ingredient_id__in=ingredient_ids)
+            .order_by()
+            .values("recipe_id")
+        )
+
+    def with_all_ingredients(self, ingredient_ids):
+        ingredient_ids = set(ingredient_ids)
+        matches = (
+            self.recipes_with_ingredients(ingredient_ids)
+            .annotate(matched=models.Count("ingredient_id"))
+            .filter(matched=len(ingredient_ids))
+            .values("recipe_id")
+        )
+        return self.filter(pk__in=matches)
+
+    def with_any_ingredients(self, ingredient_ids):
+        return self.filter(pk__in=self.recipes_with_ingredients(ingredient_ids))
+
+    def without_ingredients(self, ingredient_ids):
+        return self.exclude(pk__in=self.recipes_with_ingredients(ingredient_ids))
+
+    def latest_per_author(self, author_ids, limit):
+        if not author_ids or not limit:
+            return []
+        ranked = (
+            self.filter(author_id__in=author_ids)
+            .annotate(
+                author_rank=models.Window(
+                    expression=RowNumber(),
+                    partition_by=[models.F("author_id")],
+                    order_by=[models.F("pub_date").desc(), models.F("id").desc()],
+                )
+            )
+            .order_by()
+        )
+        sql, params = ranked.query.sql_with_params()
+        return self.raw(
+            f"SELECT * FROM ({sql}) ranked WHERE ranked.author_rank <= %s "
+            "ORDER BY ranked.author_id, ranked.author_rank",
+            (*params, limit),
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="recipes", verbose_name="Автор"
     )
     name = models.CharField(max_length=200, verbose_name="Название")
     image = models.ImageField(upload_to="foodgram/images/", verbose_name="Изображение")
+    image_variants = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Варианты изображения"
+    )
     text = models.TextField(verbose_name="Описание")
     ingredients = models.ManyToManyField(
         Ingredient, through="RecipeIngredient", verbose_name="Ингредиенты"
@@ -48,9 +121,41 @@ class Recipe(models.Model):
         verbose_name="Время приготовления в минутах",
     )
     pub_date = models.DateTimeField(auto_now_add=True, verbose_name="Дата публикации")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="В избранном"
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="В списках покупок"
+    )
+    trending_score = models.FloatField(
+        default=0, editable=False, verbose_name="Рейтинг популярности"
+    )
+    fanned_out = models.BooleanField(
+        default=False, editable=False, verbose_name="Разослан по лентам"
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(fields=["-pub_date", "-id"], name="recipe_feed_idx"),
+            models.Index(fields=["author", "-pub_date"], name="recipe_author_feed_idx"),
+            models.Index(fields=["updated_at"], name="recipe_updated_idx"),
+            models.Index(
+                fields=["-favorites_count", "-in_carts_count", "-pub_date"],
+                name="recipe_popular_idx",
+            ),
+            models.Index(
+                fields=["-trending_score", "-pub_date"], name="recipe_trending_idx"
+            ),
+            models.Index(
+                fields=["author"],
+                condition=models.Q(fanned_out=False),
+                name="recipe_pulled_idx",
+            ),
+        ]
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
 
@@ -85,6 +190,15 @@ class RecipeIngredient(models.Model):
     class Meta:
         ordering = ["recipe", "ingredient"]
         unique_together = ("recipe", "ingredient")
+        indexes = [
+            models.Index(
+                fields=["recipe", "ingredient", "amount"],
+                name="recipeingredient_cover_idx",
+            ),
+            models.Index(
+                fields=["ingredient", "recipe"], name="recipeingredient_inverted_idx"
+            ),
+        ]
         verbose_name = "Ингредиент рецепта"
         verbose_name_plural = "Ингредиенты рецепта"
 
@@ -107,10 +221,16 @@ class Favorite(models.Model):
         related_name="favorited_by",
         verbose_name="Рецепт",
     )
+    created_at = models.DateTimeField(
+        default=timezone.now, editable=False, verbose_name="Дата добавления"
+    )
 
     class Meta:
-        ordering = ["-recipe__pub_date"]
+        ordering = ["-id"]
         unique_together = ("user", "recipe")
+        indexes = [
+            models.Index(fields=["recipe", "user"], name="favorite_recipe_user_idx")
+        ]
         verbose_name = "Избранное"
         verbose_name_plural = "Избранное"
 
@@ -131,12 +251,122 @@ class ShoppingCart(models.Model):
         related_name="in_shopping_cart",
         verbose_name="Рецепт",
     )
+    created_at = models.DateTimeField(
+        default=timezone.now, editable=False, verbose_name="Дата добавления"
+    )
 
     class Meta:
-        ordering = ["-recipe__pub_date"]
+        ordering = ["-id"]
         unique_together = ("user", "recipe")
+        indexes = [models.Index(fields=["recipe", "user"], name="cart_recipe_user_idx")]
         verbose_name = "Список покупок"
         verbose_name_plural = "Списки покупок"
 
     def __str__(self):
         return f"{self.user.username} - {self.recipe.name}"
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, verbose_name="Ингредиент"
+    )
+    total_amount = models.PositiveIntegerField(verbose_name="Общее количество")
+
+    class Meta:
+        unique_together = ("user", "ingredient")
+        verbose_name = "Позиция списка покупок"
+        verbose_name_plural = "Позиции списка покупок"
+
+    def __str__(self):
+        return f"{self.user.username} - {self.ingredient.name}: {self.total_amount}"
+
+
+class MediaFile(models.Model):
+    name = models.CharField(max_length=255, unique=True, verbose_name="Файл")
+    refcount = models.PositiveIntegerField(default=0, verbose_name="Ссылок")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["refcount", "updated_at"], name="mediafile_gc_idx")
+        ]
+        verbose_name = "Медиафайл"
+        verbose_name_plural = "Медиафайлы"
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
+
+
+class DataImport(models.Model):
+    source = models.CharField(max_length=100, unique=True, verbose_name="Источник")
+    checksum = models.CharField(max_length=64, verbose_name="Контрольная сумма")
+    rows = models.PositiveIntegerField(default=0, verbose_name="Строк")
+    imported_at = models.DateTimeField(auto_now=True, verbose_name="Дата загрузки")
+
+    class Meta:
+        verbose_name = "Загрузка данных"
+        verbose_name_plural = "Загрузки данных"
+
+    def __str__(self):
+        return f"{self.source} ({self.rows})"
+
+
+class RecipeSearchDocument(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document",
+        verbose_name="Рецепт",
+    )
+    name = models.CharField(max_length=200, verbose_name="Название")
+    ingredients = models.TextField(blank=True, verbose_name="Ингредиенты")
+    text = models.TextField(verbose_name="Описание")
+
+    class Meta:
+        verbose_name = "Поисковый документ рецепта"
+        verbose_name_plural = "Поисковые документы рецептов"
+
+    def __str__(self):
+        return self.name
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name="Подписчик",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name="Рецепт",
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+", verbose_name="Автор"
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "recipe"], name="unique_feed_entry")
+        ]
+        indexes = [
+            models.Index(fields=["user", "author"], name="feedentry_user_author_idx"),
+            models.Index(
+                fields=["user", "-pub_date", "-recipe"], name="feedentry_user_pub_idx"
+            ),
+        ]
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+
+    def __str__(self):
+        return f"{self.user} - {self.recipe}"
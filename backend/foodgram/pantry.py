@@ -0,0 +1,128 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Recipe, RecipeIngredient
+
+# Transactions commit after their updated_at was stamped, so every sync
+# re-reads a short window before the previous watermark.
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+def _remove(postings, recipe_id):
+    position = bisect_left(postings, recipe_id)
+    if position < len(postings) and postings[position] == recipe_id:
+        del postings[position]
+
+
+class PantryIndex:
+    def __init__(self, ttl):
+        self._ttl = ttl
+        self._postings = {}
+        self._recipes = {}
+        self._built_at = None
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._recipes)
+
+    def rebuild(self):
+        postings, recipes = {}, {}
+        synced_at = timezone.now()
+        rows = (
+            RecipeIngredient.objects.order_by("ingredient_id", "recipe_id")
+            .values_list("ingredient_id", "recipe_id")
+            .iterator()
+        )
+        for ingredient_id, recipe_id in rows:
+            if ingredient_id not in postings:
+                postings[ingredient_id] = array("q")
+            postings[ingredient_id].append(recipe_id)
+            if recipe_id not in recipes:
+                recipes[recipe_id] = array("q")
+            recipes[recipe_id].append(ingredient_id)
+        self._postings, self._recipes = postings, recipes
+        self._built_at, self._synced_at = time.monotonic(), synced_at
+
+    def update(self, recipe_ids):
+        recipe_ids = set(recipe_ids)
+        current = {recipe_id: array("q") for recipe_id in recipe_ids}
+        rows = (
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+            .order_by("recipe_id", "ingredient_id")
+            .values_list("recipe_id", "ingredient_id")
+        )
+        for recipe_id, ingredient_id in rows:
+            current[recipe_id].append(ingredient_id)
+        for recipe_id, ingredient_ids in current.items():
+            self._discard(recipe_id)
+            if not ingredient_ids:
+                continue
+            self._recipes[recipe_id] = ingredient_ids
+            for ingredient_id in ingredient_ids:
+                if ingredient_id not in self._postings:
+                    self._postings[ingredient_id] = array("q")
+                insort(self._postings[ingredient_id], recipe_id)
+
+    def _discard(self, recipe_id):
+        for ingredient_id in self._recipes.pop(recipe_id, ()):
+            postings = self._postings[ingredient_id]
+            _remove(postings, recipe_id)
+            if not postings:
+                del self._postings[ingredient_id]
+
+    def invalidate(self):
+        self._built_at = None
+
+    def discard(self, recipe_id):
+        with self._lock:
+            self._discard(recipe_id)
+
+    def sync(self):
+        if self._built_at is None or time.monotonic() - self._built_at >= self._ttl:
+            self.rebuild()
+            return
+        synced_at = timezone.now()
+        changed = Recipe.objects.filter(
+            updated_at__gte=self._synced_at - SYNC_OVERLAP
+        ).values_list("pk", flat=True)
+        changed = set(changed)
+        if changed:
+            self.update(changed)
+        self._synced_at = synced_at
+
+    def match(self, ingredient_ids, min_coverage=0.0):
+        with self._lock:
+            self.sync()
+            matched = Counter()
+            for ingredient_id in set(ingredient_ids):
+                matched.update(self._postings.get(ingredient_id, ()))
+            results = []
+            for recipe_id, count in matched.items():
+                total = len(self._recipes[recipe_id])
+                if count / total >= min_coverage:
+                    results.append((recipe_id, count / total, total - count))
+        results.sort(key=lambda result: (-result[1], result[2], -result[0]))
+        return results
+
+    def missing(self, recipe_ids, ingredient_ids):
+        ingredient_ids = set(ingredient_ids)
+        with self._lock:
+            return {
+                recipe_id: [
+                    ingredient_id
+                    for ingredient_id in self._recipes.get(recipe_id, ())
+                    if ingredient_id not in ingredient_ids
+                ]
+                for recipe_id in recipe_ids
+            }
+
+
+pantry_index = PantryIndex(ttl=settings.PANTRY_INDEX_TTL)
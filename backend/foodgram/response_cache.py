@@ -0,0 +1,116 @@
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+CACHE_ALIAS = "responses"
+KEY_PREFIX = "foodgram:recipes"
+GENERATION_KEY = f"{KEY_PREFIX}:generation"
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Cache-Control", "Vary")
+COUNTER_KEYS = {"hits": f"{KEY_PREFIX}:hits", "misses": f"{KEY_PREFIX}:misses"}
+
+
+class Generation:
+    def __init__(self, key, alias="default"):
+        self.key = key
+        self.alias = alias
+
+    def get(self):
+        cache = caches[self.alias]
+        generation = cache.get(self.key)
+        if generation is None:
+            cache.add(self.key, time.time_ns(), None)
+            generation = cache.get(self.key, 0)
+        return generation
+
+    def bump(self):
+        caches[self.alias].set(self.key, time.time_ns(), None)
+
+
+class ResponseCache:
+    def __init__(self, alias=CACHE_ALIAS):
+        self.alias = alias
+        self.generation = Generation(GENERATION_KEY, alias)
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def invalidate(self):
+        self.generation.bump()
+
+    def make_key(self, request):
+        params = sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+            if any(values)
+        )
+        raw = repr(
+            (
+                request.build_absolute_uri(request.path),
+                request.accepted_renderer.format,
+                params,
+            )
+        )
+        digest = hashlib.sha256(raw.encode()).hexdigest()
+        return f"{KEY_PREFIX}:{self.generation.get()}:{digest}"
+
+    def fetch(self, request, build_response):
+        if request.user.is_authenticated:
+            return build_response()
+        key = self.make_key(request)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.count("hits")
+            content, headers = cached
+            response = get_conditional_response(
+                request,
+                etag=headers.get("ETag"),
+                last_modified=parse_http_date_safe(headers.get("Last-Modified")),
+            )
+            if response is None:
+                response = HttpResponse(content)
+            for name, value in headers.items():
+                response[name] = value
+            response["X-Cache"] = "HIT"
+            return response
+
+        self.count("misses")
+        response = build_response()
+        if response.status_code == 200:
+            response.add_post_render_callback(
+                lambda rendered: self.cache.set(
+                    key,
+                    (
+                        rendered.content,
+                        {
+                            name: rendered[name]
+                            for name in CACHED_HEADERS
+                            if rendered.has_header(name)
+                        },
+                    ),
+                )
+            )
+        response["X-Cache"] = "MISS"
+        return response
+
+    def count(self, name):
+        key = COUNTER_KEYS[name]
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            if not self.cache.add(key, 1, None):
+                self.cache.incr(key)
+
+    def stats(self):
+        values = self.cache.get_many(COUNTER_KEYS.values())
+        stats = {name: values.get(key, 0) for name, key in COUNTER_KEYS.items()}
+        total = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / total, 4) if total else 0.0
+        return stats
+
+
+recipe_responses = ResponseCache()
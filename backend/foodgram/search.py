@@ -0,0 +1,267 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Ingredient, Recipe, RecipeIngredient, RecipeSearchDocument
+
+SEARCH_MODES = ("prefix", "contains", "fuzzy")
+FUZZY_THRESHOLD = 0.3
+RECIPE_SEARCH_CONFIG = "russian"
+RECIPE_FTS_TABLE = "foodgram_recipesearch_fts"
+RECIPE_FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return frozenset(map("".join, zip(padded, padded[1:], padded[2:])))
+
+
+class IngredientIndex:
+    def __init__(self, rows):
+        self._entries = tuple(
+            sorted(
+                (name.casefold(), ingredient_id, name, measurement_unit)
+                for ingredient_id, name, measurement_unit in rows
+            )
+        )
+        self._keys = tuple(entry[0] for entry in self._entries)
+        self._trigrams = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def search(self, query, mode="prefix"):
+        query = query.strip().casefold()
+        if not query:
+            return []
+        if mode == "contains":
+            entries = self._contains(query)
+        elif mode == "fuzzy":
+            entries = self._fuzzy(query)
+        else:
+            entries = self._prefix(query)
+        return [
+            Ingredient(id=ingredient_id, name=name, measurement_unit=unit)
+            for _, ingredient_id, name, unit in entries
+        ]
+
+    def _prefix(self, query):
+        start = bisect_left(self._keys, query)
+        end = start
+        while end < len(self._keys) and self._keys[end].startswith(query):
+            end += 1
+        return self._entries[start:end]
+
+    def _contains(self, query):
+        ranked = []
+        for entry in self._entries:
+            position = entry[0].find(query)
+            if position == -1:
+                continue
+            if position == 0:
+                rank = 0
+            elif not entry[0][position - 1].isalnum():
+                rank = 1
+            else:
+                rank = 2
+            ranked.append((rank, position, entry))
+        ranked.sort(key=lambda item: item[:2])
+        return [entry for _, _, entry in ranked]
+
+    def _fuzzy(self, query):
+        if self._trigrams is None:
+            self._trigrams = tuple(_trigrams(entry[0]) for entry in self._entries)
+        query_trigrams = _trigrams(query)
+        ranked = []
+        for entry, trigrams in zip(self._entries, self._trigrams):
+            similarity = len(query_trigrams & trigrams) / len(query_trigrams | trigrams)
+            if similarity >= FUZZY_THRESHOLD or query in entry[0]:
+                ranked.append((-similarity, entry))
+        ranked.sort(key=lambda item: item[0])
+        return [entry for _, entry in ranked]
+
+
+class MemoryIngredientSearch:
+    def __init__(self, ttl):
+        self._ttl = ttl
+        self._index = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def get_index(self):
+        index = self._index
+        if index is not None and time.monotonic() - self._built_at < self._ttl:
+            return index
+        with self._lock:
+            if self._index is None or time.monotonic() - self._built_at >= self._ttl:
+                self._index = IngredientIndex(
+                    Ingredient.objects.order_by().values_list(
+                        "id", "name", "measurement_unit"
+                    )
+                )
+                self._built_at = time.monotonic()
+            return self._index
+
+    def invalidate(self):
+        self._index = None
+
+    def search(self, query, mode="prefix"):
+        return self.get_index().search(query, mode)
+
+
+class DatabaseIngredientSearch:
+    def invalidate(self):
+        pass
+
+    def search(self, query, mode="prefix"):
+        query = query.strip()
+        if not query:
+            return Ingredient.objects.none()
+        queryset = Ingredient.objects.all()
+        if mode == "prefix":
+            return queryset.filter(name__istartswith=query)
+        if mode == "fuzzy" and connection.vendor == "postgresql":
+            from django.contrib.postgres.search import TrigramSimilarity
+
+            return (
+                queryset.annotate(similarity=TrigramSimilarity("name", query))
+                .filter(similarity__gte=FUZZY_THRESHOLD)
+                .order_by("-similarity", "name")
+            )
+        return (
+            queryset.filter(name__icontains=query)
+            .annotate(
+                match_rank=Case(
+                    When(name__istartswith=query, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField(),
+                )
+            )
+            .order_by("match_rank", "name")
+        )
+
+
+def _create_backend():
+    if settings.INGREDIENT_SEARCH_BACKEND == "database":
+        return DatabaseIngredientSearch()
+    return MemoryIngredientSearch(ttl=settings.INGREDIENT_INDEX_TTL)
+
+
+ingredient_search = _create_backend()
+
+
+class RecipeSearch:
+    def __init__(self):
+        self._fts_tables = {}
+
+    def schedule(self, recipe_ids):
+        recipe_ids = set(recipe_ids)
+        if recipe_ids:
+            transaction.on_commit(lambda: self.index(recipe_ids))
+
+    def index(self, recipe_ids):
+        ingredients = {}
+        rows = RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).order_by(
+            "recipe_id", "ingredient__name"
+        )
+        for recipe_id, name in rows.values_list("recipe_id", "ingredient__name"):
+            ingredients.setdefault(recipe_id, []).append(name)
+        documents = [
+            RecipeSearchDocument(
+                recipe_id=recipe_id,
+                name=name,
+                ingredients=", ".join(ingredients.get(recipe_id, ())),
+                text=text,
+            )
+            for recipe_id, name, text in Recipe.objects.filter(
+                pk__in=recipe_ids
+            ).values_list("id", "name", "text")
+        ]
+        with transaction.atomic():
+            RecipeSearchDocument.objects.filter(recipe_id__in=recipe_ids).delete()
+            RecipeSearchDocument.objects.bulk_create(documents)
+
+    def has_fts_table(self, alias):
+        if alias not in self._fts_tables:
+            with connections[alias].cursor() as cursor:
+                tables = connections[alias].introspection.table_names(cursor)
+            self._fts_tables[alias] = RECIPE_FTS_TABLE in tables
+        return self._fts_tables[alias]
+
+    def search(self, queryset, query):
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return queryset.none()
+        vendor = connections[queryset.db].vendor
+        if vendor == "postgresql":
+            queryset = self._search_postgres(queryset, query)
+        elif vendor == "sqlite" and self.has_fts_table(queryset.db):
+            queryset = self._search_fts5(queryset, terms)
+        else:
+            queryset = self._search_basic(queryset, terms)
+        return queryset.order_by("-search_rank", "-pub_date", "-id")
+
+    def _search_postgres(self, queryset, query):
+        tsquery = f"websearch_to_tsquery('{RECIPE_SEARCH_CONFIG}', %s)"
+        return queryset.filter(
+            pk__in=RawSQL(
+                "SELECT recipe_id FROM foodgram_recipesearchdocument "
+                f"WHERE vector @@ {tsquery}",
+                (query,),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT ts_rank_cd(vector, {tsquery}) "
+                "FROM foodgram_recipesearchdocument "
+                "WHERE recipe_id = foodgram_recipe.id",
+                (query,),
+                output_field=FloatField(),
+            )
+        )
+
+    def _search_fts5(self, queryset, terms):
+        match = " ".join(f'"{term}"*' for term in terms)
+        weights = ", ".join(map(str, RECIPE_FTS_WEIGHTS))
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {RECIPE_FTS_TABLE} "
+                f"WHERE {RECIPE_FTS_TABLE} MATCH %s",
+                (match,),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT -bm25({RECIPE_FTS_TABLE}, {weights}) "
+                f"FROM {RECIPE_FTS_TABLE} "
+                f"WHERE {RECIPE_FTS_TABLE} MATCH %s "
+                "AND rowid = foodgram_recipe.id",
+                (match,),
+                output_field=FloatField(),
+            )
+        )
+
+    def _search_basic(self, queryset, terms):
+        condition = Q()
+        name_matches = Q()
+        for term in terms:
+            condition &= (
+                Q(search_document__name__icontains=term)
+                | Q(search_document__ingredients__icontains=term)
+                | Q(search_document__text__icontains=term)
+            )
+            name_matches &= Q(search_document__name__icontains=term)
+        return queryset.filter(condition).annotate(
+            search_rank=Case(
+                When(name_matches, then=Value(1.0)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+
+
+recipe_search = RecipeSearch()
@@ -0,0 +1,111 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db.models import Case, F, PositiveIntegerField, Sum, When
+from django.db.models.functions import Greatest
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+User = get_user_model()
+
+
+def recipe_amounts(recipe_ids):
+    return Counter(
+        dict(
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+            .values("ingredient_id")
+            .annotate(amount=Sum("amount"))
+            .order_by()
+            .values_list("ingredient_id", "amount")
+        )
+    )
+
+
+def apply_deltas(user_ids, deltas):
+    user_ids = sorted(set(user_ids))
+    deltas = {ingredient_id: delta for ingredient_id, delta in deltas.items() if delta}
+    if not user_ids or not deltas:
+        return
+    list(User.objects.select_for_update().filter(id__in=user_ids).values_list("id"))
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas
+    )
+    existing = set(items.values_list("user_id", "ingredient_id"))
+    if existing:
+        items.update(
+            total_amount=Case(
+                *(
+                    When(
+                        ingredient_id=ingredient_id,
+                        then=Greatest(F("total_amount") + delta, 0),
+                    )
+                    for ingredient_id, delta in deltas.items()
+                ),
+                default=F("total_amount"),
+                output_field=PositiveIntegerField(),
+            )
+        )
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=user_id, ingredient_id=ingredient_id, total_amount=delta
+        )
+        for user_id in user_ids
+        for ingredient_id, delta in deltas.items()
+        if delta > 0 and (user_id, ingredient_id) not in existing
+    )
+    ShoppingListItem.objects.filter(user_id__in=user_ids, total_amount__lte=0).delete()
+
+
+def add_recipes(user_id, recipe_ids):
+    apply_deltas([user_id], recipe_amounts(recipe_ids))
+
+
+def remove_recipes(user_id, recipe_ids):
+    amounts = recipe_amounts(recipe_ids)
+    apply_deltas([user_id], {key: -value for key, value in amounts.items()})
+
+
+def change_recipe(recipe_id, old_amounts, new_amounts):
+    deltas = Counter(new_amounts)
+    deltas.subtract(old_amounts)
+    holders = ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+        "user_id", flat=True
+    )
+    apply_deltas(holders, deltas)
+
+
+def expected_items(user_ids=None):
+    if user_ids is None:
+        lookup = {"recipe__in_shopping_cart__isnull": False}
+    else:
+        lookup = {"recipe__in_shopping_cart__user_id__in": user_ids}
+    rows = (
+        RecipeIngredient.objects.filter(**lookup)
+        .values("ingredient_id", user_id=F("recipe__in_shopping_cart__user_id"))
+        .annotate(total_amount=Sum("amount"))
+        .values_list("user_id", "ingredient_id", "total_amount")
+        .order_by()
+    )
+    return {(user_id, ingredient_id): total for user_id, ingredient_id, total in rows}
+
+
+def stored_items(user_ids=None):
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in items.values_list(
+            "user_id", "ingredient_id", "total_amount"
+        )
+    }
+
+
+def rebuild(user_ids):
+    ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=user_id, ingredient_id=ingredient_id, total_amount=total
+        )
+        for (user_id, ingredient_id), total in expected_items(user_ids).items()
+    )
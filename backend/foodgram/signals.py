@@ -0,0 +1,226 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import feed, images, media, shopping_list
+from users.models import Follow
+
+from .catalogue import invalidate_ingredient_catalogue
+from .counters import adjust_counters
+from .models import Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart
+from .pantry import pantry_index
+from .response_cache import recipe_responses
+from .search import ingredient_search, recipe_search
+
+User = get_user_model()
+
+AUTHOR_FIELDS = (
+    "email",
+    "username",
+    "first_name",
+    "last_name",
+    "avatar",
+    "avatar_variants",
+)
+
+MEDIA_FIELDS = {
+    Recipe: ("image", "image_variants"),
+    User: ("avatar", "avatar_variants"),
+}
+
+# Переключатели API пишут связи сырым SQL и сами правят счётчики, поэтому
+# сигналы ловят только изменения через ORM: админку и каскады.
+RELATION_COUNTERS = {
+    Favorite: (Recipe, "recipe_id", "favorites_count"),
+    ShoppingCart: (Recipe, "recipe_id", "in_carts_count"),
+    Follow: (User, "author_id", "followers_count"),
+}
+
+
+_deferred = threading.local()
+
+
+def touch_recipes(recipes):
+    recipes.update(updated_at=timezone.now())
+    transaction.on_commit(recipe_responses.invalidate)
+
+
+def refresh_recipes(recipe_ids):
+    recipe_search.schedule(recipe_ids)
+    touch_recipes(Recipe.objects.filter(pk__in=recipe_ids))
+
+
+@contextmanager
+def deferred_recipe_touches():
+    # Строки ингредиентов меняются пачкой: рецепты обновляются и
+    # переиндексируются один раз на выходе, а не на каждую строку.
+    recipe_ids = _deferred.recipe_ids = set()
+    try:
+        yield
+    finally:
+        del _deferred.recipe_ids
+    if recipe_ids:
+        refresh_recipes(recipe_ids)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, instance, created=False, **kwargs):
+    ingredient_search.invalidate()
+    invalidate_ingredient_catalogue()
+    if not created:
+        recipes = Recipe.objects.filter(recipe_ingredients__ingredient=instance)
+        recipe_search.schedule(recipes.values_list("pk", flat=True))
+        touch_recipes(recipes)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_responses(sender, **kwargs):
+    transaction.on_commit(recipe_responses.invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+def count_created_recipe(sender, instance, created, **kwargs):
+    if created:
+        adjust_counters(User.objects.filter(pk=instance.author_id), recipes_count=1)
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    adjust_counters(User.objects.filter(pk=instance.author_id), recipes_count=-1)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+def count_created_relation(sender, instance, created, **kwargs):
+    if created:
+        model, key, field = RELATION_COUNTERS[sender]
+        adjust_counters(model.objects.filter(pk=getattr(instance, key)), **{field: 1})
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Follow)
+def count_deleted_relation(sender, instance, **kwargs):
+    model, key, field = RELATION_COUNTERS[sender]
+    adjust_counters(model.objects.filter(pk=getattr(instance, key)), **{field: -1})
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, **kwargs):
+    recipe_search.schedule([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_cart_recipe(sender, instance, created, **kwargs):
+    if created:
+        shopping_list.add_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_cart_recipe(sender, instance, **kwargs):
+    # pre_delete: при каскаде от рецепта его ингредиенты ещё на месте.
+    shopping_list.remove_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=Recipe)
+def discard_pantry_recipe(sender, instance, **kwargs):
+    pantry_index.discard(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_recipe_image(sender, instance, **kwargs):
+    if images.needs_variants(instance.image, instance.image_variants):
+        images.schedule(images.process_recipe_image, instance.pk, instance.image.name)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def touch_recipe(sender, instance, **kwargs):
+    deferred = getattr(_deferred, "recipe_ids", None)
+    if deferred is not None:
+        deferred.add(instance.recipe_id)
+    else:
+        refresh_recipes([instance.recipe_id])
+
+
+def author_state(instance):
+    values = (getattr(instance, name) for name in AUTHOR_FIELDS)
+    return tuple(getattr(value, "name", value) or None for value in values)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_author(sender, instance, update_fields=None, **kwargs):
+    instance._author_state = None
+    if instance._state.adding:
+        return
+    if update_fields is not None and not set(AUTHOR_FIELDS) & set(update_fields):
+        return
+    stored = sender.objects.filter(pk=instance.pk).values_list(*AUTHOR_FIELDS).first()
+    if stored is not None:
+        instance._author_state = tuple(value or None for value in stored)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def touch_author_recipes(sender, instance, **kwargs):
+    # Рецепты показывают только эти поля автора: пароль, last_login и
+    # прочие правки не сбрасывают ETag и кеш страниц.
+    before = getattr(instance, "_author_state", None)
+    if before is not None and before != author_state(instance):
+        touch_recipes(Recipe.objects.filter(author_id=instance.pk))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def schedule_avatar(sender, instance, **kwargs):
+    if images.needs_variants(instance.avatar, instance.avatar_variants):
+        images.schedule(images.process_avatar, instance.pk, instance.avatar.name)
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_media(sender, instance, update_fields=None, **kwargs):
+    fields = MEDIA_FIELDS[sender]
+    instance._media_files = None
+    if update_fields is not None and not set(fields) & set(update_fields):
+        return
+    stored = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+    instance._media_files = images.referenced_files(*stored) if stored else set()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def count_media(sender, instance, **kwargs):
+    before = instance._media_files
+    if before is None:
+        return
+    file_field, variants_field = MEDIA_FIELDS[sender]
+    after = images.referenced_files(
+        getattr(instance, file_field).name, getattr(instance, variants_field)
+    )
+    media.retain(after - before)
+    media.release(before - after)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def release_media(sender, instance, **kwargs):
+    file_field, variants_field = MEDIA_FIELDS[sender]
+    media.release(
+        images.referenced_files(
+            getattr(instance, file_field).name, getattr(instance, variants_field)
+        )
+    )
@@ -1,14 +1,87 @@
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+import textwrap
+import warnings
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import F
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APIClient
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework import status
-from .models import Recipe, Ingredient, RecipeIngredient, Favorite, ShoppingCart
+from rest_framework.exceptions import ValidationError
+from .models import (
+    Recipe,
+    Ingredient,
+    RecipeIngredient,
+    Favorite,
+    ShoppingCart,
+    ShoppingListItem,
+    MediaFile,
+    DataImport,
+    RecipeSearchDocument,
+    FeedEntry,
+)
 from django.contrib.auth import get_user_model
+from users.models import Follow
+from .response_cache import recipe_responses
+from .pantry import PantryIndex, pantry_index
+from .search import recipe_search
+from . import trending
+from .checks import check_trending_horizon
+from api.fields import decode_image
+from api.serializers import RecipeSerializer
+from server.urls import serve_media
 
 
 User = get_user_model()
 
 
+def create_recipe(author, name, ingredients=(), text="Текст", cooking_time=10):
+    recipe = Recipe.objects.create(
+        author=author, name=name, text=text, cooking_time=cooking_time
+    )
+    for ingredient in ingredients:
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=ingredient, amount=1)
+    return recipe
+
+
+class KitchenFixtureMixin:
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="cook", password="cookpass")
+        self.client = APIClient()
+        self.egg, self.milk, self.flour, self.salt = (
+            Ingredient.objects.create(name=name, measurement_unit="г")
+            for name in ("яйцо", "молоко", "мука", "соль")
+        )
+        self.omelette = create_recipe(
+            self.user, "Омлет", [self.egg, self.milk], cooking_time=10
+        )
+        self.pancakes = create_recipe(
+            self.user, "Блины", [self.egg, self.milk, self.flour], cooking_time=40
+        )
+        self.bread = create_recipe(
+            self.user, "Хлеб", [self.flour, self.salt], cooking_time=120
+        )
+
+
 class RecipeModelTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="testuser", password="testpass")
@@ -42,7 +115,24 @@ class IngredientAPITest(TestCase):
         url = reverse("foodgram:ingredients-list")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(len(response.data), 2)
+        self.assertGreaterEqual(len(response.json()), 2)
+
+    def test_catalogue_etag(self):
+        url = reverse("foodgram:ingredients-list")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("max-age", response["Cache-Control"])
+        etag = response["ETag"]
+        self.assertEqual(
+            {item["name"] for item in response.json()}, {"яблоки", "груши"}
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        Ingredient.objects.create(name="сливы", measurement_unit="г")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()), 3)
 
     def test_search_ingredients(self):
         url = reverse("foodgram:ingredients-list")
@@ -51,6 +141,27 @@ class IngredientAPITest(TestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]["name"], "яблоки")
 
+    def test_search_ingredients_case_insensitive_prefix(self):
+        Ingredient.objects.create(name="Яблочный сок", measurement_unit="мл")
+        url = reverse("foodgram:ingredients-list")
+        response = self.client.get(url, {"name": "ЯБЛ"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["name"] for item in response.data], ["яблоки", "Яблочный сок"]
+        )
+
+    def test_search_ingredients_contains_and_fuzzy(self):
+        Ingredient.objects.create(name="сок яблочный", measurement_unit="мл")
+        url = reverse("foodgram:ingredients-list")
+        response = self.client.get(url, {"name": "ябл", "match": "contains"})
+        self.assertEqual(
+            [item["name"] for item in response.data], ["яблоки", "сок яблочный"]
+        )
+        response = self.client.get(url, {"name": "грушы", "match": "fuzzy"})
+        self.assertEqual(response.data[0]["name"], "груши")
+        response = self.client.get(url, {"name": "ябл", "match": "regex"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class RecipeAPITest(TestCase):
     def setUp(self):
@@ -120,6 +231,67 @@ class RecipeAPITest(TestCase):
         )
         self.assertEqual(updated_ingredient.amount, 200)
 
+    def test_update_recipe_diffs_ingredients(self):
+        recipe = Recipe.objects.create(
+            author=self.user, name="Рецепт", text="Описание", cooking_time=20
+        )
+        kept, changed, removed, added = (
+            Ingredient.objects.create(name=f"ингредиент {i}", measurement_unit="г")
+            for i in range(4)
+        )
+        rows = {
+            ingredient.id: RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=50
+            ).id
+            for ingredient in (kept, changed, removed)
+        }
+        for i in range(10):
+            RecipeIngredient.objects.create(
+                recipe=recipe,
+                ingredient=Ingredient.objects.create(
+                    name=f"лишний {i}", measurement_unit="г"
+                ),
+                amount=5,
+            )
+        url = reverse("foodgram:recipes-detail", args=[recipe.id])
+        with CaptureQueriesContext(connection) as queries, patch.object(
+            recipe_search, "index"
+        ) as index, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                url,
+                {
+                    "ingredients": [
+                        {"id": kept.id, "amount": 50},
+                        {"id": changed.id, "amount": 80},
+                        {"id": added.id, "amount": 10},
+                    ]
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        current = {
+            row.ingredient_id: (row.id, row.amount)
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        self.assertEqual(current[kept.id], (rows[kept.id], 50))
+        self.assertEqual(current[changed.id], (rows[changed.id], 80))
+        self.assertEqual(current[added.id][1], 10)
+        self.assertNotIn(removed.id, current)
+        self.assertEqual(len(current), 3)
+        statements = [query["sql"] for query in queries]
+        for prefix, count in (
+            ('INSERT INTO "foodgram_recipeingredient"', 1),
+            ('DELETE FROM "foodgram_recipeingredient"', 1),
+            ('UPDATE "foodgram_recipeingredient"', 1),
+            # Сохранение самого рецепта и одна отметка об изменении ингредиентов.
+            ('UPDATE "foodgram_recipe"', 2),
+        ):
+            with self.subTest(statement=prefix):
+                self.assertEqual(
+                    sum(sql.startswith(prefix) for sql in statements), count
+                )
+        self.assertLessEqual(index.call_count, 2)
+
     def test_update_recipe_without_ingredients(self):
         recipe = Recipe.objects.create(
             author=self.user, name="Тестовый рецепт", text="Описание", cooking_time=20
@@ -175,6 +347,33 @@ class FavoriteAPITest(TestCase):
             Favorite.objects.filter(user=self.user, recipe=self.recipe).exists()
         )
 
+    def test_favorites_count(self):
+        url = reverse("foodgram:recipes-favorite", args=[self.recipe.id])
+        self.client.post(url)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.client.delete(url)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_popular_ordering_and_reconcile(self):
+        popular = Recipe.objects.create(
+            author=self.user, name="Популярный", text="Описание", cooking_time=5
+        )
+        Favorite.objects.create(user=self.user, recipe=popular)
+        popular.refresh_from_db()
+        self.assertEqual(popular.favorites_count, 1)
+        Recipe.objects.filter(pk=popular.pk).update(favorites_count=0)
+        with self.assertRaises(CommandError):
+            call_command("reconcile_counters", "--check", stdout=io.StringIO())
+        call_command("reconcile_counters", stdout=io.StringIO())
+        popular.refresh_from_db()
+        self.assertEqual(popular.favorites_count, 1)
+        response = self.client.get(
+            reverse("foodgram:recipes-list"), {"ordering": "popular"}
+        )
+        self.assertEqual(response.data["results"][0]["id"], popular.id)
+
 
 class ShoppingCartAPITest(TestCase):
     def setUp(self):
@@ -210,3 +409,1700 @@ class ShoppingCartAPITest(TestCase):
         self.assertFalse(
             ShoppingCart.objects.filter(user=self.user, recipe=self.recipe).exists()
         )
+
+
+class RecipeQueryCountTest(TestCase):
+    MAX_QUERIES = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username="author", email="author@example.com", password="authorpass"
+        )
+        cls.reader = User.objects.create_user(
+            username="reader", email="reader@example.com", password="readerpass"
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"ингредиент {i}", measurement_unit="г") for i in range(3)
+        )
+        ingredients = list(Ingredient.objects.all())
+        Recipe.objects.bulk_create(
+            Recipe(author=cls.author, name=f"Рецепт {i}", text="Текст", cooking_time=5)
+            for i in range(200)
+        )
+        recipes = list(Recipe.objects.all())
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for recipe in recipes
+            for ingredient in ingredients
+        )
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.reader, recipe=recipe) for recipe in recipes[::2]
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.reader, recipe=recipe) for recipe in recipes[::3]
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assert_list_queries_bounded(self):
+        url = reverse("foodgram:recipes-list")
+        for limit in (6, 50, 200):
+            with self.subTest(limit=limit):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, {"limit": limit})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(len(response.data["results"]), limit)
+                self.assertLessEqual(len(queries), self.MAX_QUERIES)
+
+    def test_list_query_count_anonymous(self):
+        self.assert_list_queries_bounded()
+
+    def test_list_query_count_authenticated(self):
+        self.client.force_authenticate(user=self.reader)
+        self.assert_list_queries_bounded()
+        response = self.client.get(reverse("foodgram:recipes-list"), {"limit": 6})
+        flags = {
+            recipe["id"]: (recipe["is_favorited"], recipe["is_in_shopping_cart"])
+            for recipe in response.data["results"]
+        }
+        for recipe_id, (is_favorited, is_in_shopping_cart) in flags.items():
+            self.assertEqual(
+                is_favorited,
+                Favorite.objects.filter(user=self.reader, recipe_id=recipe_id).exists(),
+            )
+            self.assertEqual(
+                is_in_shopping_cart,
+                ShoppingCart.objects.filter(
+                    user=self.reader, recipe_id=recipe_id
+                ).exists(),
+            )
+        self.assertTrue(response.data["results"][0]["author"]["is_subscribed"])
+        self.assertEqual(len(response.data["results"][0]["ingredients"]), 3)
+
+    def test_detail_query_count(self):
+        self.client.force_authenticate(user=self.reader)
+        recipe = Recipe.objects.first()
+        url = reverse("foodgram:recipes-detail", args=[recipe.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(len(queries), 2)
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "responses": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "recipe-response-cache-test",
+        },
+    }
+)
+class RecipeResponseCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username="author", email="author@example.com", password="authorpass"
+        )
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="adminpass"
+        )
+        ingredient = Ingredient.objects.create(name="мука", measurement_unit="г")
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name="Блины", text="Текст", cooking_time=20
+        )
+        RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=ingredient, amount=200
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        recipe_responses.cache.clear()
+        self.list_url = reverse("foodgram:recipes-list")
+        self.detail_url = reverse("foodgram:recipes-detail", args=[self.recipe.id])
+
+    def test_anonymous_list_and_detail_are_served_from_cache(self):
+        for url in (self.list_url, self.detail_url):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    second = self.client.get(url)
+                self.assertEqual(first["X-Cache"], "MISS")
+                self.assertEqual(second["X-Cache"], "HIT")
+                self.assertEqual(len(queries), 0)
+                self.assertEqual(json.loads(second.content), first.json())
+
+    def test_query_params_are_normalized(self):
+        self.client.get(f"{self.list_url}?limit=6&offset=0&author=")
+        response = self.client.get(f"{self.list_url}?offset=0&limit=6")
+        self.assertEqual(response["X-Cache"], "HIT")
+        response = self.client.get(f"{self.list_url}?offset=0&limit=5")
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.get(self.list_url)
+        self.client.force_authenticate(user=self.author)
+        response = self.client.get(self.list_url)
+        self.assertNotIn("X-Cache", response)
+        self.assertIn("is_favorited", response.data["results"][0])
+
+    def test_recipe_ingredient_and_author_changes_invalidate(self):
+        def rename(instance, field, value):
+            setattr(instance, field, value)
+            with self.captureOnCommitCallbacks(execute=True):
+                instance.save()
+
+        ingredient = self.recipe.recipe_ingredients.get()
+        changes = (
+            (self.recipe, "name", "Оладьи", lambda data: data["name"]),
+            (ingredient, "amount", 300, lambda data: data["ingredients"][0]["amount"]),
+            (
+                self.author,
+                "first_name",
+                "Иван",
+                lambda data: data["author"]["first_name"],
+            ),
+        )
+        for instance, field, value, read in changes:
+            with self.subTest(field=field):
+                self.client.get(self.detail_url)
+                rename(instance, field, value)
+                response = self.client.get(self.detail_url)
+                self.assertEqual(response["X-Cache"], "MISS")
+                self.assertEqual(read(response.json()), value)
+
+    def test_unrendered_user_changes_do_not_invalidate(self):
+        def change_password():
+            self.author.set_password("newpass123")
+            self.author.save()
+
+        changes = (
+            lambda: self.author.save(update_fields=["last_login"]),
+            change_password,
+            lambda: self.author.save(),
+            lambda: User.objects.create_user(
+                username="newbie", email="newbie@example.com", password="newbiepass"
+            ),
+        )
+        self.recipe.refresh_from_db()
+        updated_at = self.recipe.updated_at
+        self.client.get(self.detail_url)
+        for change in changes:
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+        self.assertEqual(self.client.get(self.detail_url)["X-Cache"], "HIT")
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.updated_at, updated_at)
+
+    def test_cached_response_answers_not_modified(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_stats_are_admin_only(self):
+        url = reverse("foodgram:recipes-cache-stats")
+        self.client.get(self.list_url)
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+        self.client.force_authenticate(user=self.author)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data, {"hits": 1, "misses": 2, "hit_ratio": round(1 / 3, 4)}
+        )
+
+
+class RecipeConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username="author", email="author@example.com", password="authorpass"
+        )
+        cls.reader = User.objects.create_user(
+            username="reader", email="reader@example.com", password="readerpass"
+        )
+        cls.ingredient = Ingredient.objects.create(name="мука", measurement_unit="г")
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name="Блины", text="Текст", cooking_time=20
+        )
+        RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredient, amount=200
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        recipe_responses.cache.clear()
+        self.list_url = reverse("foodgram:recipes-list")
+        self.detail_url = reverse("foodgram:recipes-detail", args=[self.recipe.id])
+        self.link_url = reverse("foodgram:recipe-get-link", args=[self.recipe.id])
+
+    def test_unchanged_resources_answer_not_modified(self):
+        for url in (self.list_url, self.detail_url, self.link_url):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                repeated = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(repeated.status_code, status.HTTP_304_NOT_MODIFIED)
+                self.assertEqual(repeated["ETag"], response["ETag"])
+
+    def test_last_modified_for_anonymous_detail(self):
+        response = self.client.get(self.detail_url)
+        self.assertIn("Last-Modified", response)
+        repeated = self.client.get(
+            self.detail_url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(repeated.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.client.force_authenticate(user=self.reader)
+        self.assertNotIn("Last-Modified", self.client.get(self.detail_url))
+
+    def test_edits_change_validators(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        list_etag = self.client.get(self.list_url)["ETag"]
+        self.client.force_authenticate(user=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                self.detail_url,
+                {
+                    "name": "Оладьи",
+                    "ingredients": [{"id": self.ingredient.id, "amount": 300}],
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=None)
+        for url, old in ((self.detail_url, etag), (self.list_url, list_etag)):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=old)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertNotEqual(response["ETag"], old)
+
+    def test_ingredient_and_author_changes_change_validators(self):
+        for instance, field, value in (
+            (self.recipe.recipe_ingredients.get(), "amount", 1),
+            (self.ingredient, "name", "мука ржаная"),
+            (self.author, "first_name", "Иван"),
+        ):
+            with self.subTest(field=field):
+                etag = self.client.get(self.detail_url)["ETag"]
+                setattr(instance, field, value)
+                with self.captureOnCommitCallbacks(execute=True):
+                    instance.save()
+                response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_flags_change_etag(self):
+        self.client.force_authenticate(user=self.reader)
+        etag = self.client.get(self.detail_url)["ETag"]
+        self.client.post(reverse("foodgram:recipes-favorite", args=[self.recipe.id]))
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["is_favorited"])
+        self.assertIn("Authorization", response["Vary"])
+
+
+class RecipeBodyCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username="author", email="author@example.com", password="authorpass"
+        )
+        cls.reader = User.objects.create_user(
+            username="reader", email="reader@example.com", password="readerpass"
+        )
+        cls.ingredient = Ingredient.objects.create(name="мука", measurement_unit="г")
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f"Рецепт {i}", text="Текст", cooking_time=5
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=cls.ingredient, amount=100
+            )
+        cls.recipe = recipe
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.reader)
+        self.url = reverse("foodgram:recipes-list")
+
+    def ingredient_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, [
+            query for query in queries if "recipeingredient" in query["sql"]
+        ]
+
+    def test_warm_page_skips_ingredient_query_and_keeps_flags_per_user(self):
+        cold, cold_queries = self.ingredient_queries()
+        self.assertEqual(len(cold_queries), 1)
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        warm, warm_queries = self.ingredient_queries()
+        self.assertEqual(warm_queries, [])
+        self.assertEqual(warm.data["results"][0]["id"], self.recipe.id)
+        self.assertTrue(warm.data["results"][0]["is_favorited"])
+        self.assertEqual(
+            warm.data["results"][0]["ingredients"],
+            cold.data["results"][0]["ingredients"],
+        )
+        self.client.force_authenticate(user=self.author)
+        other, other_queries = self.ingredient_queries()
+        self.assertEqual(other_queries, [])
+        self.assertFalse(other.data["results"][0]["is_favorited"])
+
+    def test_edits_and_ingredient_renames_refresh_body(self):
+        self.ingredient_queries()
+        RecipeIngredient.objects.filter(recipe=self.recipe).update(amount=1)
+        self.recipe.name = "Новое название"
+        self.recipe.save()
+        response, queries = self.ingredient_queries()
+        self.assertEqual(len(queries), 1)
+        first = response.data["results"][0]
+        self.assertEqual(first["name"], "Новое название")
+        self.assertEqual(first["ingredients"][0]["amount"], 1)
+
+        self.ingredient.name = "мука пшеничная"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredient.save()
+        response, queries = self.ingredient_queries()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            response.data["results"][1]["ingredients"][0]["name"], "мука пшеничная"
+        )
+
+    def test_unannotated_instance_uses_flag_sets(self):
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        Follow.objects.create(user=self.reader, author=self.author)
+        request = APIRequestFactory().get(self.url)
+        request.user = self.reader
+        data = RecipeSerializer(
+            Recipe.objects.get(pk=self.recipe.pk), context={"request": request}
+        ).data
+        self.assertFalse(data["is_favorited"])
+        self.assertTrue(data["is_in_shopping_cart"])
+        self.assertTrue(data["author"]["is_subscribed"])
+        self.assertEqual(data["ingredients"][0]["name"], "мука")
+
+
+def encode_image(size, image_format="PNG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 120, 40)).save(buffer, image_format)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f"data:image/{image_format.lower()};base64,{encoded}"
+
+
+class DecodeImageTest(TestCase):
+    def test_decodes_chunked_payload_with_line_breaks(self):
+        data = encode_image((300, 200))
+        header, payload = data.split(",", 1)
+        wrapped = "\n".join(textwrap.wrap(payload, 76))
+        with patch("api.fields.CHUNK_SIZE", 101):
+            file = decode_image(f"{header},{wrapped}")
+        self.assertEqual(file.size, len(base64.b64decode(payload)))
+        self.assertEqual(file.read(), base64.b64decode(payload))
+        self.assertTrue(file.name.endswith(".png"))
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=64)
+    def test_rejects_oversized_payload_before_decoding(self):
+        with patch("api.fields.decode_base64") as decode:
+            with self.assertRaisesMessage(
+                ValidationError, "Изображение слишком большое"
+            ):
+                decode_image(encode_image((300, 300)))
+        decode.assert_not_called()
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=100)
+    def test_rejects_decompression_bomb_from_header(self):
+        with patch("PIL.ImageFile.ImageFile.load") as load:
+            with self.assertRaisesMessage(
+                ValidationError, "Слишком большое разрешение изображения"
+            ):
+                decode_image(encode_image((20, 20)))
+        load.assert_not_called()
+
+    def test_rejects_unsupported_and_corrupt_images(self):
+        for data in (
+            "data:image/svg+xml;base64,PHN2Zz48L3N2Zz4=",
+            "data:image/png;base64,bm90IGFuIGltYWdl",
+            "data:image/png;base64,abc",
+            "data:image/png,plain",
+        ):
+            with self.subTest(data=data):
+                with self.assertRaises(ValidationError):
+                    decode_image(data)
+
+
+class ImagePipelineTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name, IMAGE_PROCESSING="sync"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(
+            username="cook", email="cook@example.com", password="cookpass"
+        )
+        self.ingredient = Ingredient.objects.create(name="мука", measurement_unit="г")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("foodgram:recipes-list"),
+                {
+                    "name": "Блины",
+                    "text": "Текст",
+                    "cooking_time": 20,
+                    "ingredients": [{"id": self.ingredient.id, "amount": 100}],
+                    "image": encode_image((2400, 1200)),
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Recipe.objects.get(pk=response.data["id"])
+
+    def test_recipe_variants_are_rendered_after_commit(self):
+        recipe = self.create_recipe()
+        self.assertEqual(recipe.image_variants["source"], recipe.image.name)
+        for variant, bound in (("thumbnail", 320), ("medium", 800), ("full", 1600)):
+            with self.subTest(variant=variant):
+                with recipe.image.storage.open(recipe.image_variants[variant]) as file:
+                    image = Image.open(file)
+                    self.assertEqual(image.size, (bound, bound // 2))
+                    self.assertIn(image.format, ("WEBP", "JPEG"))
+
+    def test_serializers_return_variant_urls(self):
+        recipe = self.create_recipe()
+        variants = recipe.image_variants
+        listed = self.client.get(reverse("foodgram:recipes-list"))
+        self.assertTrue(listed.data["results"][0]["image"].endswith(variants["medium"]))
+        detail = self.client.get(reverse("foodgram:recipes-detail", args=[recipe.id]))
+        self.assertTrue(detail.data["image"].endswith(variants["full"]))
+        minified = self.client.post(
+            reverse("foodgram:recipes-favorite", args=[recipe.id])
+        )
+        self.assertTrue(minified.data["image"].endswith(variants["thumbnail"]))
+
+    def test_replaced_image_is_served_until_variants_are_ready(self):
+        recipe = self.create_recipe()
+        response = self.client.patch(
+            reverse("foodgram:recipes-detail", args=[recipe.id]),
+            {
+                "ingredients": [{"id": self.ingredient.id, "amount": 100}],
+                "image": encode_image((100, 100)),
+            },
+            format="json",
+        )
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.image_variants["source"], recipe.image.name)
+        self.assertTrue(response.data["image"].endswith(recipe.image.name))
+
+    def test_avatar_thumbnail(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                reverse("users:avatar"),
+                {"avatar": encode_image((1000, 1000))},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        thumbnail = self.user.avatar_variants["thumbnail"]
+        response = self.client.get(reverse("users:users-me"))
+        self.assertTrue(response.data["avatar"].endswith(thumbnail))
+
+
+class MediaStorageTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(
+            username="cook", email="cook@example.com", password="cookpass"
+        )
+        self.ingredient = Ingredient.objects.create(name="мука", measurement_unit="г")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def post_recipe(self, image):
+        response = self.client.post(
+            reverse("foodgram:recipes-list"),
+            {
+                "name": "Блины",
+                "text": "Текст",
+                "cooking_time": 20,
+                "ingredients": [{"id": self.ingredient.id, "amount": 100}],
+                "image": image,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Recipe.objects.get(pk=response.data["id"])
+
+    def refcount(self, name):
+        return MediaFile.objects.get(name=name).refcount
+
+    def test_identical_uploads_share_one_hashed_file(self):
+        image = encode_image((40, 40))
+        first, second = self.post_recipe(image), self.post_recipe(image)
+        self.assertEqual(first.image.name, second.image.name)
+        digest = hashlib.sha256(base64.b64decode(image.split(",")[1])).hexdigest()
+        self.assertEqual(first.image.name, f"foodgram/images/{digest[:2]}/{digest}.png")
+        self.assertEqual(self.refcount(first.image.name), 2)
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory), [f"{digest}.png"])
+
+    def test_replaced_and_deleted_images_are_released_and_collected(self):
+        recipe = self.post_recipe(encode_image((40, 40)))
+        old_name = recipe.image.name
+        self.client.patch(
+            reverse("foodgram:recipes-detail", args=[recipe.id]),
+            {
+                "ingredients": [{"id": self.ingredient.id, "amount": 100}],
+                "image": encode_image((50, 50)),
+            },
+            format="json",
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(self.refcount(old_name), 0)
+        self.assertEqual(self.refcount(recipe.image.name), 1)
+
+        call_command("collect_media", grace_minutes=0, stdout=io.StringIO())
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertFalse(MediaFile.objects.filter(name=old_name).exists())
+        self.assertTrue(default_storage.exists(recipe.image.name))
+
+        new_name = recipe.image.name
+        self.client.delete(reverse("foodgram:recipes-detail", args=[recipe.id]))
+        self.assertEqual(self.refcount(new_name), 0)
+        call_command("collect_media", stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(new_name))
+
+    def test_deleting_shared_avatar_keeps_file(self):
+        other = User.objects.create_user(
+            username="guest", email="guest@example.com", password="guestpass"
+        )
+        other_client = APIClient()
+        other_client.force_authenticate(user=other)
+        avatar = encode_image((40, 40))
+        for client in (self.client, other_client):
+            response = client.put(reverse("users:avatar"), {"avatar": avatar})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        other.refresh_from_db()
+        name = other.avatar.name
+        self.assertEqual(self.refcount(name), 2)
+
+        response = self.client.delete(reverse("users:avatar"))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.avatar)
+        self.assertEqual(self.refcount(name), 1)
+        self.assertTrue(default_storage.exists(name))
+        call_command("collect_media", grace_minutes=0, stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(name))
+
+    def test_recount_repairs_drift(self):
+        recipe = self.post_recipe(encode_image((40, 40)))
+        MediaFile.objects.update(refcount=0)
+        MediaFile.objects.create(name="foodgram/images/lost.png", refcount=3)
+        out = io.StringIO()
+        call_command("collect_media", recount=True, grace_minutes=0, stdout=out)
+        self.assertIn("Исправлено счётчиков ссылок: 2", out.getvalue())
+        self.assertEqual(self.refcount(recipe.image.name), 1)
+        self.assertFalse(MediaFile.objects.filter(refcount=0).exists())
+
+    @override_settings(DEBUG=True)
+    def test_media_is_served_as_immutable(self):
+        request = APIRequestFactory().get("/media/x")
+        default_storage.save("users/avatars/a.png", ContentFile(b"avatar"))
+        name = hashlib.sha256(b"avatar").hexdigest()
+        response = serve_media(
+            request, f"users/avatars/{name[:2]}/{name}.png", settings.MEDIA_ROOT
+        )
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("max-age=31536000", response["Cache-Control"])
+
+
+class RecipeCursorPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="paged", password="pass")
+        Recipe.objects.bulk_create(
+            Recipe(author=cls.author, name=f"Рецепт {i}", text="Текст", cooking_time=5)
+            for i in range(15)
+        )
+        tie = Recipe.objects.order_by("id").values_list("pub_date", flat=True)[0]
+        Recipe.objects.filter(id__in=Recipe.objects.order_by("id")[:6]).update(
+            pub_date=tie
+        )
+        cls.expected = list(
+            Recipe.objects.order_by("-pub_date", "-id").values_list("id", flat=True)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        recipe_responses.cache.clear()
+        self.url = reverse("foodgram:recipes-list")
+
+    def test_walk_all_pages(self):
+        seen = []
+        response = self.client.get(self.url, {"cursor": "", "limit": 4})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIsNone(response.data["count"])
+            seen.extend(recipe["id"] for recipe in response.data["results"])
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+        self.assertEqual(seen, self.expected)
+
+    def test_limit_offset_compatibility(self):
+        response = self.client.get(self.url, {"limit": 4, "offset": 4})
+        self.assertEqual(response.data["count"], 15)
+        self.assertEqual(
+            [recipe["id"] for recipe in response.data["results"]], self.expected[4:8]
+        )
+        response = self.client.get(
+            self.url, {"limit": 4, "offset": 12, "count": "none"}
+        )
+        self.assertIsNone(response.data["count"])
+        self.assertIsNone(response.data["next"])
+        self.assertEqual(len(response.data["results"]), 3)
+        response = self.client.get(self.url, {"limit": 4, "count": "estimate"})
+        self.assertGreater(response.data["count"], 0)
+        self.assertIsNotNone(response.data["next"])
+
+    def cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def test_naive_cursor_is_read_as_utc(self):
+        first = self.client.get(self.url, {"cursor": "", "limit": 4})
+        pub_date = Recipe.objects.get(pk=self.expected[3]).pub_date
+        naive = timezone.make_naive(pub_date, timezone.utc).isoformat()
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", RuntimeWarning)
+            response = self.client.get(
+                self.url,
+                {"cursor": self.cursor([naive, self.expected[3]]), "limit": 4},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"],
+            self.client.get(first.data["next"]).data["results"],
+        )
+
+    def test_invalid_cursor_and_ordering(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        for position in (
+            [None, None],
+            ["", 1],
+            [["2024-01-01"], {"id": 1}],
+            [True, 1],
+            [1.5, 1],
+            ["2026-01-01T00:00:00+00:00", 10**24],
+            ["2026-01-01T00:00:00+00:00", -(10**24)],
+            {"pub_date": "2024-01-01", "id": 1},
+        ):
+            with self.subTest(position=position):
+                response = self.client.get(self.url, {"cursor": self.cursor(position)})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(self.url, {"cursor": "", "ordering": "popular"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {"count": "sometimes"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(
+            User(username=f"planner{i}", email=f"planner{i}@example.com")
+            for i in range(50)
+        )
+        users = list(User.objects.all())
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"ингредиент {i}", measurement_unit="г") for i in range(50)
+        )
+        ingredients = list(Ingredient.objects.all())
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=users[i % 50], name=f"Рецепт {i}", text="Текст", cooking_time=5
+            )
+            for i in range(500)
+        )
+        recipes = list(Recipe.objects.all())
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient=ingredients[(recipe.id + k) % 50], amount=1
+            )
+            for recipe in recipes
+            for k in range(3)
+        )
+        Favorite.objects.bulk_create(
+            Favorite(user=users[i % 50], recipe=recipes[i]) for i in range(500)
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=users[i % 50], recipe=recipes[i]) for i in range(500)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=users[i], author=users[(i + 1) % 50]) for i in range(50)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        cls.user = users[0]
+        cls.recipe = recipes[0]
+        cls.ingredient_ids = [ingredient.id for ingredient in ingredients]
+
+    def slow_plan_steps(self, queryset, allow_sort):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                if not allow_sort:
+                    cursor.execute("SET LOCAL enable_sort = off")
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                nodes, steps = [plan[0]["Plan"]], []
+                while nodes:
+                    node = nodes.pop()
+                    nodes.extend(node.get("Plans", []))
+                    if node["Node Type"] == "Seq Scan" or (
+                        node["Node Type"] == "Sort" and not allow_sort
+                    ):
+                        steps.append(node["Node Type"])
+                return steps
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [
+                detail
+                for *_, detail in cursor.fetchall()
+                if detail.startswith("SCAN ")
+                and " USING " not in detail
+                or "FOR ORDER BY" in detail
+                and not allow_sort
+            ]
+
+    def test_hot_queries_use_indexes(self):
+        # Ленты должны читаться по индексу уже в нужном порядке, а фильтры
+        # по избранному и корзине — хотя бы без полного просмотра таблиц.
+        queries = {
+            "author feed": (
+                Recipe.objects.filter(author=self.user).order_by("-pub_date")[:6],
+                False,
+            ),
+            "feed page": (Recipe.objects.order_by("-pub_date", "-id")[:6], False),
+            "trending page": (
+                Recipe.objects.order_by("-trending_score", "-pub_date")[:6],
+                False,
+            ),
+            "favorites filter": (
+                Recipe.objects.filter(favorited_by__user=self.user),
+                True,
+            ),
+            "cart filter": (
+                Recipe.objects.filter(in_shopping_cart__user=self.user),
+                True,
+            ),
+            "favorite flag": (
+                Favorite.objects.filter(recipe=self.recipe, user=self.user),
+                False,
+            ),
+            "cart flag": (
+                ShoppingCart.objects.filter(recipe=self.recipe, user=self.user),
+                False,
+            ),
+            "recipe ingredients": (
+                RecipeIngredient.objects.filter(recipe_id__in=[self.recipe.id])
+                .order_by()
+                .values_list("ingredient_id", "amount"),
+                False,
+            ),
+            "ingredients all": (
+                Recipe.objects.with_all_ingredients(
+                    [self.ingredient_ids[0], self.ingredient_ids[1]]
+                ),
+                True,
+            ),
+            "ingredients any": (
+                Recipe.objects.with_any_ingredients([self.ingredient_ids[0]]),
+                True,
+            ),
+            "subscription feed page": (
+                FeedEntry.objects.filter(user=self.user).order_by(
+                    "-pub_date", "-recipe_id"
+                )[:6],
+                False,
+            ),
+            "followers": (Follow.objects.filter(author=self.user), False),
+            "following": (Follow.objects.filter(user=self.user), False),
+        }
+        for name, (queryset, allow_sort) in queries.items():
+            with self.subTest(query=name):
+                self.assertEqual(self.slow_plan_steps(queryset, allow_sort), [])
+
+
+class DownloadShoppingCartTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="buyer", password="buyerpass")
+        self.client.force_authenticate(user=self.user)
+        flour = Ingredient.objects.create(name="мука", measurement_unit="г")
+        milk = Ingredient.objects.create(name="молоко", measurement_unit="мл")
+        for name, flour_amount in (("Блины", 200), ("Оладьи", 300)):
+            recipe = Recipe.objects.create(
+                author=self.user, name=name, text="Описание", cooking_time=20
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=flour, amount=flour_amount
+            )
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=milk, amount=100)
+            self.client.post(
+                reverse("foodgram:recipes-shopping-cart", args=[recipe.id])
+            )
+        self.url = reverse("foodgram:recipes-download-shopping-cart")
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content).decode()
+
+    def test_download_txt(self):
+        content = self.download()
+        self.assertEqual(
+            content, "Список покупок:\nмолоко (мл) — 200\nмука (г) — 500\n"
+        )
+
+    def test_download_csv_and_json(self):
+        self.assertEqual(
+            self.download(format="csv").splitlines(),
+            ["Ингредиент,Единица измерения,Количество", "молоко,мл,200", "мука,г,500"],
+        )
+        self.assertEqual(
+            json.loads(self.download(format="json")),
+            [
+                {"name": "молоко", "measurement_unit": "мл", "amount": 200},
+                {"name": "мука", "measurement_unit": "г", "amount": 500},
+            ],
+        )
+
+    def test_download_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        recipe = Recipe.objects.get(name="Блины")
+        self.client.delete(reverse("foodgram:recipes-shopping-cart", args=[recipe.id]))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_etag_tracks_amounts_and_ingredient_names(self):
+        etag = self.client.get(self.url)["ETag"]
+        items = ShoppingListItem.objects.filter(user=self.user)
+        # Сдвиги +1/−1 оставляли прежними суммы, по которым строился ETag.
+        items.filter(ingredient__name="мука").update(total_amount=F("total_amount") + 1)
+        items.filter(ingredient__name="молоко").update(
+            total_amount=F("total_amount") - 1
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+        Ingredient.objects.filter(name="мука").update(measurement_unit="кг")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_download_empty_cart(self):
+        for recipe in Recipe.objects.all():
+            self.client.delete(
+                reverse("foodgram:recipes-shopping-cart", args=[recipe.id])
+            )
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ShoppingListAggregateTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="cook", password="cookpass")
+        self.other = User.objects.create_user(
+            username="guest", email="guest@example.com", password="guestpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.flour = Ingredient.objects.create(name="мука", measurement_unit="г")
+        self.eggs = Ingredient.objects.create(name="яйца", measurement_unit="шт")
+        self.recipe = Recipe.objects.create(
+            author=self.user, name="Блины", text="Описание", cooking_time=20
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.flour, amount=200
+        )
+        self.cart_url = reverse("foodgram:recipes-shopping-cart", args=[self.recipe.id])
+        self.list_url = reverse("foodgram:recipes-shopping-list")
+
+    def current_list(self, client=None):
+        response = (client or self.client).get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item["name"]: item["amount"] for item in response.data}
+
+    def test_add_and_remove_recipe(self):
+        self.client.post(self.cart_url)
+        self.assertEqual(self.current_list(), {"мука": 200})
+        self.client.delete(self.cart_url)
+        self.assertEqual(self.current_list(), {})
+
+    def test_recipe_update_propagates_to_carts(self):
+        other_client = APIClient()
+        other_client.force_authenticate(user=self.other)
+        other_client.post(self.cart_url)
+        self.client.post(self.cart_url)
+        response = self.client.patch(
+            reverse("foodgram:recipes-detail", args=[self.recipe.id]),
+            {
+                "ingredients": [
+                    {"id": self.flour.id, "amount": 150},
+                    {"id": self.eggs.id, "amount": 2},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.current_list(), {"мука": 150, "яйца": 2})
+        self.assertEqual(self.current_list(other_client), {"мука": 150, "яйца": 2})
+        self.client.delete(reverse("foodgram:recipes-detail", args=[self.recipe.id]))
+        self.assertEqual(self.current_list(other_client), {})
+
+    def test_orm_and_cascade_deletes_update_carts(self):
+        other_client = APIClient()
+        other_client.force_authenticate(user=self.other)
+        other_client.post(self.cart_url)
+        Recipe.objects.filter(pk=self.recipe.pk).delete()
+        self.assertEqual(self.current_list(other_client), {})
+
+        recipe = Recipe.objects.create(
+            author=self.user, name="Оладьи", text="Описание", cooking_time=20
+        )
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=self.eggs, amount=3)
+        other_client.post(reverse("foodgram:recipes-shopping-cart", args=[recipe.id]))
+        self.user.delete()
+        self.assertEqual(self.current_list(other_client), {})
+
+    def test_orm_cart_changes_update_list(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        self.assertEqual(self.current_list(), {"мука": 200})
+        ShoppingCart.objects.filter(user=self.user).delete()
+        self.assertEqual(self.current_list(), {})
+
+    def test_drifted_aggregate_does_not_go_negative(self):
+        self.client.post(self.cart_url)
+        ShoppingListItem.objects.update(total_amount=50)
+        self.client.delete(self.cart_url)
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_rebuild_command(self):
+        self.client.post(self.cart_url)
+        ShoppingListItem.objects.update(total_amount=1)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_shopping_lists", "--check", stdout=io.StringIO())
+        call_command("rebuild_shopping_lists", stdout=io.StringIO())
+        self.assertEqual(self.current_list(), {"мука": 200})
+
+
+class BulkToggleTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="syncer", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.user, name=f"Рецепт {i}", text="Описание", cooking_time=5
+            )
+            for i in range(3)
+        ]
+        self.ids = [recipe.id for recipe in self.recipes]
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+
+    def statuses(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item["status"] for item in response.data["results"]]
+
+    def test_bulk_favorite(self):
+        self.assertEqual(
+            list(
+                Recipe.objects.order_by("id").values_list("favorites_count", flat=True)
+            ),
+            [1, 0, 0],
+        )
+        url = reverse("foodgram:recipes-favorite-bulk")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                url, {"ids": self.ids + [999999]}, format="json"
+            )
+        statements = [
+            query["sql"]
+            for query in queries
+            if not query["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT"))
+        ]
+        self.assertEqual(len(statements), 4)
+        self.assertEqual(
+            self.statuses(response), ["exists", "added", "added", "not_found"]
+        )
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 3)
+        response = self.client.delete(
+            url, {"ids": self.ids[:2] + [999999]}, format="json"
+        )
+        self.assertEqual(self.statuses(response), ["removed", "removed", "not_found"])
+        response = self.client.delete(url, {"ids": self.ids[:1]}, format="json")
+        self.assertEqual(self.statuses(response), ["missing"])
+        self.assertEqual(
+            list(
+                Recipe.objects.order_by("id").values_list("favorites_count", flat=True)
+            ),
+            [0, 0, 1],
+        )
+
+    def test_bulk_shopping_cart(self):
+        RecipeIngredient.objects.create(
+            recipe=self.recipes[1],
+            ingredient=Ingredient.objects.create(name="соль", measurement_unit="г"),
+            amount=5,
+        )
+        url = reverse("foodgram:recipes-shopping-cart-bulk")
+        response = self.client.post(url, {"ids": self.ids}, format="json")
+        self.assertEqual(self.statuses(response), ["added", "added", "added"])
+        self.assertEqual(ShoppingListItem.objects.get(user=self.user).total_amount, 5)
+
+    def test_bulk_invalid_payload(self):
+        url = reverse("foodgram:recipes-favorite-bulk")
+        for payload in ({"ids": []}, {"ids": ["x"]}, {"ids": [2**70]}, {}):
+            for method in ("post", "delete"):
+                with self.subTest(payload=payload, method=method):
+                    response = getattr(self.client, method)(url, payload, format="json")
+                    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConcurrentToggleTest(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("In-memory SQLite does not allow concurrent writers")
+        self.user = User.objects.create_user(username="clicker", password="pass")
+        self.recipe = Recipe.objects.create(
+            author=self.user, name="Рецепт", text="Описание", cooking_time=5
+        )
+
+    def hammer(self, url, method):
+        def request(_):
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            try:
+                return getattr(client, method)(url).status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            return sorted(executor.map(request, range(self.THREADS * 2)))
+
+    def test_concurrent_favorite(self):
+        url = reverse("foodgram:recipes-favorite", args=[self.recipe.id])
+        codes = self.hammer(url, "post")
+        self.assertEqual(codes.count(status.HTTP_201_CREATED), 1)
+        self.assertEqual(codes.count(status.HTTP_400_BAD_REQUEST), len(codes) - 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+        codes = self.hammer(url, "delete")
+        self.assertEqual(codes.count(status.HTTP_204_NO_CONTENT), 1)
+        self.assertEqual(codes.count(status.HTTP_400_BAD_REQUEST), len(codes) - 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+
+class InitDataTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, filename, content):
+        path = os.path.join(self.directory, filename)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def write_json(self, count, filename="ingredients.json"):
+        return self.write(
+            filename,
+            json.dumps(
+                [
+                    {"name": f"ингредиент {index}", "measurement_unit": "г"}
+                    for index in range(count)
+                ],
+                ensure_ascii=False,
+            ),
+        )
+
+    def load(self, path, *args):
+        out = io.StringIO()
+        call_command("init_data", path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_json_import_batches_inserts(self):
+        path = self.write_json(250)
+        with patch("foodgram.management.commands.init_data.READ_SIZE", 97):
+            with CaptureQueriesContext(connection) as queries:
+                self.load(path, "--batch-size", "100")
+        self.assertEqual(Ingredient.objects.count(), 250)
+        inserts = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith("INSERT")
+            and '"foodgram_ingredient"' in query["sql"]
+        ]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(DataImport.objects.get(source="ingredients").rows, 250)
+
+    def test_csv_import(self):
+        path = self.write(
+            "ingredients.csv",
+            'name,measurement_unit\nмука,г\n\n"соль, морская",щепотка\n',
+        )
+        self.load(path)
+        self.assertEqual(
+            set(Ingredient.objects.values_list("name", "measurement_unit")),
+            {("мука", "г"), ("соль, морская", "щепотка")},
+        )
+
+    def test_unchanged_file_is_skipped(self):
+        path = self.write_json(10)
+        self.load(path)
+        with CaptureQueriesContext(connection) as queries:
+            output = self.load(path)
+        self.assertIn("пропускаем", output)
+        self.assertLessEqual(len(queries), 2)
+
+        self.load(path, "--force")
+        self.assertEqual(Ingredient.objects.count(), 10)
+
+    def test_changed_or_emptied_table_reloads(self):
+        path = self.write_json(10)
+        self.load(path)
+        Ingredient.objects.all().delete()
+        self.load(path)
+        self.assertEqual(Ingredient.objects.count(), 10)
+
+        path = self.write_json(15)
+        output = self.load(path)
+        self.assertIn("добавлено ингредиентов: 5", output)
+        self.assertEqual(Ingredient.objects.count(), 15)
+
+    def test_existing_ingredients_are_kept(self):
+        Ingredient.objects.create(name="ингредиент 0", measurement_unit="г")
+        self.load(self.write_json(3))
+        self.assertEqual(Ingredient.objects.count(), 3)
+
+    def test_missing_file(self):
+        output = self.load(os.path.join(self.directory, "missing.json"))
+        self.assertIn("Файл не найден", output)
+        self.assertFalse(DataImport.objects.exists())
+
+    def test_broken_json(self):
+        path = self.write("ingredients.json", '[{"name": "мука", "measurement')
+        with self.assertRaises(CommandError):
+            self.load(path)
+        self.assertFalse(Ingredient.objects.exists())
+
+
+class RecipeSearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cook", password="cookpass")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("foodgram:recipes-list")
+        self.beet = Ingredient.objects.create(name="свёкла", measurement_unit="г")
+        self.cabbage = Ingredient.objects.create(name="капуста", measurement_unit="г")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.borscht = create_recipe(
+                self.user, "Борщ", [self.beet, self.cabbage], text="Классический суп"
+            )
+            self.salad = create_recipe(
+                self.user,
+                "Винегрет",
+                [self.beet],
+                text="Салат, в который идёт борщевая свёкла",
+            )
+            self.pie = create_recipe(
+                self.user, "Пирог", [self.cabbage], text="Пирог с капустой"
+            )
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {"search": query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["results"]
+
+    def ids(self, results):
+        return [recipe["id"] for recipe in results]
+
+    def test_documents_follow_recipes(self):
+        document = RecipeSearchDocument.objects.get(recipe=self.borscht)
+        self.assertEqual(document.ingredients, "капуста, свёкла")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cabbage.name = "кольраби"
+            self.cabbage.save()
+        document.refresh_from_db()
+        self.assertEqual(document.ingredients, "кольраби, свёкла")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.borscht.delete()
+        self.assertFalse(RecipeSearchDocument.objects.filter(pk=document.pk).exists())
+
+    def test_name_match_ranks_first(self):
+        self.assertEqual(
+            self.ids(self.search("борщ")), [self.borscht.id, self.salad.id]
+        )
+        self.assertEqual(
+            self.ids(self.search("капуст")), [self.pie.id, self.borscht.id]
+        )
+
+    def test_matches_ingredients_and_all_terms(self):
+        self.assertCountEqual(
+            self.ids(self.search("свёкла")), [self.borscht.id, self.salad.id]
+        )
+        self.assertEqual(self.ids(self.search("суп капуста")), [self.borscht.id])
+        self.assertEqual(self.search("!!!"), [])
+
+    def test_results_keep_user_flags(self):
+        Favorite.objects.create(user=self.user, recipe=self.pie)
+        results = self.search("пирог")
+        self.assertEqual(self.ids(results), [self.pie.id])
+        self.assertTrue(results[0]["is_favorited"])
+
+    def test_update_reindexes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse("foodgram:recipes-detail", args=[self.pie.id]),
+                {
+                    "name": "Пирог",
+                    "text": "Пирог со свёклой",
+                    "cooking_time": 10,
+                    "ingredients": [{"id": self.beet.id, "amount": 2}],
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(self.pie.id, self.ids(self.search("капуста")))
+        self.assertIn(self.pie.id, self.ids(self.search("свёкла")))
+
+    def test_basic_fallback(self):
+        with patch.object(recipe_search, "has_fts_table", return_value=False):
+            self.assertEqual(self.ids(self.search("Пирог")), [self.pie.id])
+            self.assertEqual(self.ids(self.search("суп капуста")), [self.borscht.id])
+
+    def test_rebuild_command(self):
+        RecipeSearchDocument.objects.all().delete()
+        self.assertEqual(self.search("борщ"), [])
+        call_command("rebuild_search_index", stdout=io.StringIO())
+        self.assertEqual(RecipeSearchDocument.objects.count(), 3)
+        self.assertEqual(self.ids(self.search("борщ"))[0], self.borscht.id)
+
+
+class RecipeIngredientFilterTest(KitchenFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("foodgram:recipes-list")
+
+    def filter_ids(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {recipe["id"] for recipe in response.data["results"]}
+
+    def ids(self, *ingredients):
+        return ",".join(str(ingredient.id) for ingredient in ingredients)
+
+    def test_ingredients_all(self):
+        self.assertEqual(
+            self.filter_ids(ingredients_all=self.ids(self.egg, self.milk)),
+            {self.omelette.id, self.pancakes.id},
+        )
+        self.assertEqual(
+            self.filter_ids(ingredients_all=self.ids(self.egg, self.flour, self.egg)),
+            {self.pancakes.id},
+        )
+        self.assertEqual(
+            self.filter_ids(ingredients_all=self.ids(self.egg, self.salt)), set()
+        )
+
+    def test_ingredients_any_and_none(self):
+        self.assertEqual(
+            self.filter_ids(ingredients_any=self.ids(self.milk, self.salt)),
+            {self.omelette.id, self.pancakes.id, self.bread.id},
+        )
+        self.assertEqual(
+            self.filter_ids(ingredients_none=self.ids(self.flour)),
+            {self.omelette.id},
+        )
+        self.assertEqual(
+            self.filter_ids(
+                ingredients_any=self.ids(self.egg), ingredients_none=self.ids(self.milk)
+            ),
+            set(),
+        )
+
+    def test_max_cooking_time(self):
+        self.assertEqual(
+            self.filter_ids(max_cooking_time=40), {self.omelette.id, self.pancakes.id}
+        )
+        self.assertEqual(
+            self.filter_ids(max_cooking_time=60, ingredients_all=self.ids(self.flour)),
+            {self.pancakes.id},
+        )
+
+    def test_query_does_not_grow_with_ingredients(self):
+        ingredient_ids = range(1000, 1010)
+        for queryset in (
+            Recipe.objects.with_all_ingredients(ingredient_ids),
+            Recipe.objects.with_any_ingredients(ingredient_ids),
+            Recipe.objects.without_ingredients(ingredient_ids),
+        ):
+            sql = str(queryset.query)
+            self.assertNotIn("JOIN", sql)
+            self.assertEqual(sql.count("foodgram_recipeingredient"), 1)
+
+    def test_invalid_ids(self):
+        for name, value in (
+            ("ingredients_any", "яйцо"),
+            ("ingredients_all", "1.5"),
+            ("ingredients_all", f"{self.egg.id},0"),
+            ("ingredients_none", str(2**64)),
+        ):
+            with self.subTest(**{name: value}):
+                response = self.client.get(self.url, {name: value})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PantryMatchTest(KitchenFixtureMixin, TestCase):
+    def setUp(self):
+        pantry_index.invalidate()
+        self.addCleanup(pantry_index.invalidate)
+        super().setUp()
+        self.url = reverse("foodgram:recipes-match")
+
+    def match(self, *ingredients, **params):
+        response = self.client.get(
+            self.url,
+            {"ingredients": ",".join(str(item.id) for item in ingredients), **params},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["results"]
+
+    def test_orders_by_coverage_with_missing_ingredients(self):
+        results = self.match(self.egg, self.milk, self.salt)
+        self.assertEqual(
+            [(recipe["id"], recipe["coverage"]) for recipe in results],
+            [
+                (self.omelette.id, 1.0),
+                (self.pancakes.id, 0.6667),
+                (self.bread.id, 0.5),
+            ],
+        )
+        self.assertEqual(results[0]["missing_ingredients"], [])
+        self.assertEqual(
+            [item["name"] for item in results[1]["missing_ingredients"]], ["мука"]
+        )
+        self.assertIn("is_favorited", results[0])
+
+    def test_min_coverage_and_pagination(self):
+        results = self.match(self.egg, self.milk, self.salt, min_coverage=0.6)
+        self.assertEqual(
+            [recipe["id"] for recipe in results],
+            [self.omelette.id, self.pancakes.id],
+        )
+        response = self.client.get(
+            self.url, {"ingredients": self.egg.id, "limit": 1, "offset": 1}
+        )
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(response.data["results"][0]["id"], self.pancakes.id)
+
+    def test_index_follows_recipe_changes(self):
+        self.match(self.salt)
+        RecipeIngredient.objects.create(
+            recipe=self.omelette, ingredient=self.salt, amount=1
+        )
+        RecipeIngredient.objects.filter(
+            recipe=self.bread, ingredient=self.salt
+        ).delete()
+        results = self.match(self.salt)
+        self.assertEqual([recipe["id"] for recipe in results], [self.omelette.id])
+        self.assertEqual(results[0]["coverage"], 0.3333)
+
+        self.omelette.delete()
+        self.assertEqual(self.match(self.salt), [])
+
+    def test_incremental_update_matches_rebuild(self):
+        index = PantryIndex(ttl=3600)
+        index.rebuild()
+        RecipeIngredient.objects.filter(recipe=self.pancakes).delete()
+        RecipeIngredient.objects.create(
+            recipe=self.pancakes, ingredient=self.salt, amount=1
+        )
+        index.update([self.pancakes.id, self.bread.id])
+        rebuilt = PantryIndex(ttl=3600)
+        rebuilt.rebuild()
+        self.assertEqual(index._postings, rebuilt._postings)
+        self.assertEqual(index._recipes, rebuilt._recipes)
+
+    def test_invalid_request(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {"ingredients": "яйцо"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(
+            self.url, {"ingredients": self.egg.id, "min_coverage": 2}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SubscriptionFeedTest(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(
+            username="reader", email="reader@example.com", password="pass"
+        )
+        self.author = User.objects.create_user(
+            username="author", email="author@example.com", password="pass"
+        )
+        self.other = User.objects.create_user(
+            username="other", email="other@example.com", password="pass"
+        )
+        self.old_recipe = create_recipe(self.author, "Старый рецепт")
+        create_recipe(self.other, "Чужой рецепт")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.reader)
+        self.url = reverse("foodgram:recipes-feed")
+
+    def subscribe(self, author, method="post"):
+        url = reverse("users:users-subscribe", args=[author.id])
+        return getattr(self.client, method)(url)
+
+    def feed_ids(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe["id"] for recipe in response.data["results"]]
+
+    def test_subscribe_backfills_and_unsubscribe_cleans_up(self):
+        self.assertEqual(self.feed_ids(), [])
+        self.assertEqual(self.subscribe(self.author).status_code, 201)
+        self.assertEqual(self.feed_ids(), [self.old_recipe.id])
+
+        self.assertEqual(self.subscribe(self.author, "delete").status_code, 204)
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed_ids(), [])
+
+    def test_new_recipes_fan_out_to_followers(self):
+        self.subscribe(self.author)
+        author_client = APIClient()
+        author_client.force_authenticate(user=self.author)
+        response = author_client.post(
+            reverse("foodgram:recipes-list"),
+            {
+                "name": "Новый рецепт",
+                "text": "Текст",
+                "cooking_time": 5,
+                "ingredients": [
+                    {
+                        "id": Ingredient.objects.create(
+                            name="соль", measurement_unit="г"
+                        ).id,
+                        "amount": 1,
+                    }
+                ],
+                "image": (
+                    "data:image/png;base64,"
+                    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+                ),
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.feed_ids(), [response.data["id"], self.old_recipe.id])
+        self.assertEqual(FeedEntry.objects.filter(author=self.author).count(), 2)
+
+    def test_popular_authors_are_read_on_demand(self):
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=0):
+            self.subscribe(self.author)
+            new_recipe = create_recipe(self.author, "Новый рецепт")
+            new_recipe.refresh_from_db()
+            self.assertFalse(new_recipe.fanned_out)
+            self.assertFalse(FeedEntry.objects.filter(recipe=new_recipe).exists())
+            self.assertEqual(self.feed_ids(), [new_recipe.id, self.old_recipe.id])
+        entry = FeedEntry.objects.get(user=self.reader, recipe=new_recipe)
+        self.assertEqual(entry.pub_date, new_recipe.pub_date)
+
+    def test_pulled_recipes_survive_dropping_under_threshold(self):
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=0):
+            self.subscribe(self.author)
+            new_recipe = create_recipe(self.author, "Новый рецепт")
+        self.assertEqual(self.feed_ids(), [new_recipe.id, self.old_recipe.id])
+
+    def test_subscribing_to_popular_author_backfills(self):
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=0):
+            self.subscribe(self.author)
+            self.assertTrue(
+                FeedEntry.objects.filter(
+                    user=self.reader, recipe=self.old_recipe
+                ).exists()
+            )
+            self.assertEqual(self.feed_ids(), [self.old_recipe.id])
+
+    def test_bulk_subscribe_and_cursor_pages(self):
+        recipes = [create_recipe(self.other, f"Рецепт {i}") for i in range(3)]
+        response = self.client.post(
+            reverse("users:users-subscribe-bulk"),
+            {"ids": [self.author.id, self.other.id]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first = self.client.get(self.url, {"cursor": "", "limit": 3})
+        self.assertEqual(
+            [recipe["id"] for recipe in first.data["results"]],
+            [recipe.id for recipe in reversed(recipes)],
+        )
+        second = self.client.get(first.data["next"])
+        self.assertEqual(len(second.data["results"]), 2)
+        self.assertIsNone(second.data["next"])
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TrendingRecipesTest(TestCase):
+    def setUp(self):
+        recipe_responses.cache.clear()
+        self.author = User.objects.create_user(
+            username="author", email="author@example.com", password="pass"
+        )
+        self.fans = [
+            User.objects.create_user(
+                username=f"fan{index}", email=f"fan{index}@example.com", password="pass"
+            )
+            for index in range(3)
+        ]
+        self.classic, self.fresh, self.quiet = (
+            Recipe.objects.create(
+                author=self.author, name=name, text="Текст", cooking_time=10
+            )
+            for name in ("Классика", "Новинка", "Тихий")
+        )
+
+    def toggle(self, user, recipe, action="favorite", method="post"):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        url = reverse(f"foodgram:recipes-{action}", args=[recipe.id])
+        return getattr(client, method)(url)
+
+    def trending_ids(self):
+        response = APIClient().get(
+            reverse("foodgram:recipes-list"), {"ordering": "trending"}
+        )
+        return [recipe["id"] for recipe in response.json()["results"]]
+
+    def test_recent_activity_outranks_older_favorites(self):
+        long_ago = timezone.now() - timedelta(days=30)
+        Favorite.objects.bulk_create(
+            Favorite(user=fan, recipe=self.classic, created_at=long_ago)
+            for fan in self.fans
+        )
+        Recipe.objects.filter(pk=self.classic.pk).update(favorites_count=3)
+        trending.recompute()
+        self.assertEqual(self.toggle(self.fans[0], self.fresh).status_code, 201)
+        self.assertEqual(
+            self.trending_ids(), [self.fresh.id, self.classic.id, self.quiet.id]
+        )
+        response = APIClient().get(
+            reverse("foodgram:recipes-list"), {"ordering": "popular"}
+        )
+        self.assertEqual(response.json()["results"][0]["id"], self.classic.id)
+
+    def test_cart_weighs_more_and_removal_is_exact(self):
+        self.toggle(self.fans[0], self.classic)
+        self.toggle(self.fans[1], self.fresh, "shopping-cart")
+        self.assertEqual(self.trending_ids()[:2], [self.fresh.id, self.classic.id])
+
+        self.toggle(self.fans[1], self.fresh, "shopping-cart", "delete")
+        self.fresh.refresh_from_db()
+        self.assertAlmostEqual(self.fresh.trending_score, 0.0)
+
+    def test_incremental_scores_match_recompute(self):
+        for fan in self.fans:
+            self.toggle(fan, self.classic)
+            self.toggle(fan, self.fresh, "shopping-cart")
+        self.toggle(self.fans[0], self.classic, method="delete")
+        client = APIClient()
+        client.force_authenticate(user=self.fans[2])
+        client.delete(
+            reverse("foodgram:recipes-shopping-cart-bulk"),
+            {"ids": [self.fresh.id]},
+            format="json",
+        )
+        self.assertEqual(trending.recompute(), 0)
+        Recipe.objects.update(trending_score=0)
+        self.assertEqual(trending.recompute(), 2)
+        self.classic.refresh_from_db()
+        self.assertAlmostEqual(
+            self.classic.trending_score / trending.decay_factor(timezone.now()),
+            2 * trending.FAVORITE_WEIGHT,
+            places=3,
+        )
+
+    def test_recompute_keeps_toggles_made_after_snapshot(self):
+        self.toggle(self.fans[0], self.classic)
+        Recipe.objects.update(trending_score=0)
+        real_snapshot = trending.snapshot
+
+        def snapshot_then_toggle():
+            result = real_snapshot()
+            self.toggle(self.fans[1], self.classic, "shopping-cart")
+            return result
+
+        with patch.object(trending, "snapshot", snapshot_then_toggle):
+            self.assertEqual(trending.recompute(), 1)
+        self.assertEqual(trending.recompute(), 0)
+        self.classic.refresh_from_db()
+        self.assertAlmostEqual(
+            self.classic.trending_score / trending.decay_factor(timezone.now()),
+            trending.FAVORITE_WEIGHT + trending.CART_WEIGHT,
+            places=3,
+        )
+
+    def test_overflowing_half_life_fails_system_check(self):
+        self.assertEqual(check_trending_horizon(None), [])
+        for half_life in (6, 0):
+            with self.subTest(half_life=half_life), override_settings(
+                TRENDING_HALF_LIFE_HOURS=half_life
+            ):
+                [error] = check_trending_horizon(None)
+                self.assertIn(error.id, ("foodgram.E001", "foodgram.E002"))
+        with override_settings(
+            TRENDING_HALF_LIFE_HOURS=6,
+            TRENDING_EPOCH=timezone.now().date().isoformat(),
+        ):
+            self.assertEqual(check_trending_horizon(None), [])
+
+    def test_recompute_command(self):
+        Favorite.objects.create(user=self.fans[0], recipe=self.quiet)
+        out = io.StringIO()
+        call_command("recompute_trending", stdout=out)
+        self.assertIn("Обновлено рейтингов: 1", out.getvalue())
+        self.assertEqual(self.trending_ids()[0], self.quiet.id)
@@ -0,0 +1,91 @@
+from collections import defaultdict
+from datetime import datetime
+from math import isclose
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Favorite, Recipe, ShoppingCart
+
+FAVORITE_WEIGHT = 1.0
+CART_WEIGHT = 2.0
+EVENTS = ((Favorite, FAVORITE_WEIGHT), (ShoppingCart, CART_WEIGHT))
+
+
+def epoch():
+    return timezone.make_aware(datetime.fromisoformat(settings.TRENDING_EPOCH))
+
+
+def decay_factor(at, since=None):
+    # Вклад события растёт вдвое каждые TRENDING_HALF_LIFE_HOURS от общей
+    # точки отсчёта: так сравнение сумм равносильно сравнению рейтингов,
+    # затухших к текущему моменту, и столбец можно держать в индексе.
+    hours = (at - (since or epoch())).total_seconds() / 3600
+    return 2 ** (hours / settings.TRENDING_HALF_LIFE_HOURS)
+
+
+def apply_deltas(deltas):
+    deltas = {recipe_id: delta for recipe_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    Recipe.objects.filter(pk__in=deltas).update(
+        trending_score=Greatest(
+            F("trending_score")
+            + Case(
+                *(
+                    When(pk=recipe_id, then=Value(delta))
+                    for recipe_id, delta in deltas.items()
+                ),
+                output_field=FloatField(),
+            ),
+            Value(0.0),
+        )
+    )
+
+
+def record(events, weight):
+    since = epoch()
+    deltas = defaultdict(float)
+    for recipe_id, at in events:
+        deltas[recipe_id] += weight * decay_factor(at, since)
+    apply_deltas(deltas)
+
+
+def compute_scores():
+    since = epoch()
+    scores = defaultdict(float)
+    for model, weight in EVENTS:
+        rows = model.objects.order_by().values_list("recipe_id", "created_at")
+        for recipe_id, created_at in rows.iterator():
+            scores[recipe_id] += weight * decay_factor(created_at, since)
+    return scores
+
+
+def snapshot():
+    # Столбец и строки связей читаются из одного снимка базы без блокировок:
+    # переключатели меняют их в одной транзакции, поэтому снимок согласован.
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        stored = dict(Recipe.objects.values_list("pk", "trending_score"))
+        return stored, compute_scores()
+
+
+def recompute(batch_size=500):
+    stored, scores = snapshot()
+    # Пишется разница со снимком, а не новое значение: вклад переключений,
+    # закоммиченных после снимка, сохраняется в trending_score.
+    deltas = [
+        (recipe_id, scores.get(recipe_id, 0.0) - score)
+        for recipe_id, score in stored.items()
+        if not isclose(score, scores.get(recipe_id, 0.0), rel_tol=1e-9)
+    ]
+    for start in range(0, len(deltas), batch_size):
+        end = start + batch_size
+        apply_deltas(dict(deltas[start:end]))
+    return len(deltas)
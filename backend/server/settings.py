@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -94,6 +95,10 @@ DATABASES = {
         "PORT": os.getenv("DB_PORT", default=None),
     }
 }
+# The SQLite test database is a file rather than :memory:, so the threaded
+# toggle tests run against real locks instead of being skipped.
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    DATABASES["default"]["TEST"] = {"NAME": BASE_DIR / "test_db.sqlite3"}
 
 AUTH_USER_MODEL = "users.CustomUser"
 
@@ -137,6 +142,14 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 # Media files (user avatars, recipe images)
 MEDIA_URL = "media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# Uploads are named by their SHA-256, so identical files are stored once.
+DEFAULT_FILE_STORAGE = "foodgram.storage.ContentAddressedStorage"
+MEDIA_GC_GRACE_MINUTES = int(os.getenv("MEDIA_GC_GRACE_MINUTES", 60))
+
+# Ingredient fixture loaded by init_data (.json or .csv)
+INGREDIENTS_DATA_PATH = os.getenv(
+    "INGREDIENTS_DATA_PATH", BASE_DIR / "data" / "ingredients.json"
+)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -158,6 +171,81 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Ingredient autocomplete: "memory" keeps a sorted prefix index per process,
+# "database" queries the table (backed by a pg_trgm index on PostgreSQL).
+INGREDIENT_SEARCH_BACKEND = os.getenv("INGREDIENT_SEARCH_BACKEND", "memory")
+INGREDIENT_INDEX_TTL = int(os.getenv("INGREDIENT_INDEX_TTL", 300))
+INGREDIENT_CATALOGUE_MAX_AGE = int(os.getenv("INGREDIENT_CATALOGUE_MAX_AGE", 3600))
+
+# Pantry matching keeps an ingredient -> recipe ids index per process; it is
+# synced from recently updated recipes on each request and fully rebuilt
+# after PANTRY_INDEX_TTL seconds (which also drops deleted recipes).
+PANTRY_INDEX_TTL = int(os.getenv("PANTRY_INDEX_TTL", 3600))
+PANTRY_MAX_INGREDIENTS = int(os.getenv("PANTRY_MAX_INGREDIENTS", 100))
+
+# Subscription feed: new recipes are written into each follower's feed,
+# except for authors with more followers than this. Such recipes are marked
+# as not fanned out and copied into a reader's feed when it is read, so the
+# decision does not change when the author's follower count does.
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv("FEED_FANOUT_MAX_FOLLOWERS", 10_000))
+
+# ordering=trending: favorites and cart additions lose half their weight
+# every TRENDING_HALF_LIFE_HOURS. Scores are stored relative to
+# TRENDING_EPOCH and grow as 2 ** (hours since epoch / half-life); the
+# foodgram.E002 system check fails startup (migrate) 100 half-lives before
+# that overflows a float, so the epoch can be moved forward and
+# recompute_trending run in time.
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", 72))
+TRENDING_EPOCH = os.getenv("TRENDING_EPOCH", "2026-01-01")
+
+# Rendered recipe list/detail pages for anonymous users. locmem evicts the
+# least recently used entries past MAX_ENTRIES, Redis follows its own
+# maxmemory-policy (allkeys-lru); "redis" needs django-redis installed.
+# locmem keeps the generation key per process: an edit invalidates pages
+# only in the worker that handled it, others serve stale pages until
+# RESPONSE_CACHE_TTL. With several gunicorn workers use "file" or "redis".
+RESPONSE_CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "foodgram-responses",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("RESPONSE_CACHE_LOCATION", BASE_DIR / "cache"),
+    },
+    "redis": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL", "redis://127.0.0.1:6379/1"),
+    },
+    "dummy": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "locmem")
+if RESPONSE_CACHE_BACKEND == "redis" and find_spec("django_redis") is None:
+    RESPONSE_CACHE_BACKEND = "locmem"
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 60))
+# User-independent part of a recipe, keyed by id and updated_at.
+RECIPE_BODY_CACHE_TTL = int(os.getenv("RECIPE_BODY_CACHE_TTL", 3600))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "responses": {
+        **RESPONSE_CACHE_BACKENDS[RESPONSE_CACHE_BACKEND],
+        "TIMEOUT": RESPONSE_CACHE_TTL,
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1000))},
+    },
+}
+
+# Resized variants of uploaded recipe images and avatars: "thread" renders
+# them on a per-process worker pool after commit, "sync" right after commit.
+IMAGE_PROCESSING = os.getenv("IMAGE_PROCESSING", "thread")
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", 80))
+# Limits for base64 uploads, checked before and while decoding.
+IMAGE_UPLOAD_MAX_BYTES = int(os.getenv("IMAGE_UPLOAD_MAX_BYTES", 8 * 1024 * 1024))
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv("IMAGE_UPLOAD_MAX_PIXELS", 40_000_000))
+
 DJOSER = {
     "LOGIN_FIELD": "email",
     "HIDE_USERS": False,
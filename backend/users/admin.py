@@ -5,7 +5,15 @@ from .models import CustomUser, Follow
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
-    list_display = ("email", "username", "first_name", "last_name", "is_staff")
+    list_display = (
+        "email",
+        "username",
+        "first_name",
+        "last_name",
+        "recipes_count",
+        "followers_count",
+        "is_staff",
+    )
     search_fields = ("email", "username", "first_name", "last_name")
     list_filter = ("is_staff", "is_superuser", "is_active")
     ordering = ("email",)
@@ -0,0 +1,73 @@
+# Generated by Django 3.2.3 on 2026-10-17 03:51
+
+from django.db import migrations, models
+import users.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="customuser",
+            options={
+                "ordering": ["username"],
+                "verbose_name": "Пользователь",
+                "verbose_name_plural": "Пользователи",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="follow",
+            options={
+                "ordering": ["-author__date_joined"],
+                "verbose_name": "Подписка",
+                "verbose_name_plural": "Подписки",
+            },
+        ),
+        migrations.AlterModelManagers(
+            name="customuser",
+            managers=[
+                ("objects", users.models.CustomUserManager()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="customuser",
+            name="avatar",
+            field=models.ImageField(
+                blank=True, null=True, upload_to="users/avatars/", verbose_name="Аватар"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="customuser",
+            name="email",
+            field=models.EmailField(max_length=254, unique=True, verbose_name="Почта"),
+        ),
+        migrations.AlterField(
+            model_name="customuser",
+            name="groups",
+            field=models.ManyToManyField(
+                blank=True,
+                help_text="Группы пользователя",
+                related_name="customuser_groups",
+                related_query_name="user",
+                to="auth.Group",
+                verbose_name="Группы",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="customuser",
+            name="user_permissions",
+            field=models.ManyToManyField(
+                blank=True,
+                help_text="Права пользователя",
+                related_name="customuser_user_permissions",
+                related_query_name="user",
+                to="auth.Permission",
+                verbose_name="Права пользователя",
+            ),
+        ),
+    ]
@@ -1,12 +1,38 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 
 
+class CustomUserQuerySet(models.QuerySet):
+    def with_subscription_flag(self, user):
+        if user is None or not user.is_authenticated:
+            return self.annotate(
+                is_subscribed=models.Value(False, output_field=models.BooleanField())
+            )
+        return self.annotate(
+            is_subscribed=models.Exists(
+                Follow.objects.filter(user=user, author=models.OuterRef("pk"))
+            )
+        )
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
+
+
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True, verbose_name="Почта")
     avatar = models.ImageField(
         upload_to="users/avatars/", blank=True, null=True, verbose_name="Аватар"
     )
+    avatar_variants = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Варианты аватара"
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Количество рецептов"
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Количество подписчиков"
+    )
 
     groups = models.ManyToManyField(
         "auth.Group",
@@ -28,6 +54,8 @@ class CustomUser(AbstractUser):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username", "first_name", "last_name"]
 
+    objects = CustomUserManager()
+
     class Meta:
         ordering = ["username"]
         verbose_name = "Пользователь"
@@ -52,12 +80,15 @@ class Follow(models.Model):
     )
 
     class Meta:
-        ordering = ["-author__date_joined"]
+        ordering = ["-id"]
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
         constraints = [
             models.UniqueConstraint(fields=["user", "author"], name="unique_follow")
         ]
+        indexes = [
+            models.Index(fields=["author", "user"], name="follow_author_user_idx")
+        ]
 
     def __str__(self):
         return f"{self.user} подписан на {self.author}"
@@ -1,10 +1,18 @@
+import base64
+import io
+import json
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from foodgram.models import Recipe
 from django.core.files.uploadedfile import SimpleUploadedFile
+from users.models import Follow
 
 
 User = get_user_model()
@@ -103,6 +111,64 @@ class UserAPITest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(self.user.follower.filter(author=self.other_user).exists())
 
+    def test_subscribe_updates_followers_count(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("users:users-subscribe", args=[self.other_user.id])
+        self.client.post(url)
+        self.other_user.refresh_from_db()
+        self.assertEqual(self.other_user.followers_count, 1)
+        self.client.delete(url)
+        self.other_user.refresh_from_db()
+        self.assertEqual(self.other_user.followers_count, 0)
+
+    def test_deleting_user_updates_counters(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post(reverse("users:users-subscribe", args=[self.other_user.id]))
+        recipe = Recipe.objects.create(
+            author=self.other_user, name="Рецепт", text="Текст", cooking_time=5
+        )
+        self.client.post(reverse("foodgram:recipes-favorite", args=[recipe.id]))
+        self.client.post(reverse("foodgram:recipes-shopping-cart", args=[recipe.id]))
+        self.user.delete()
+        self.other_user.refresh_from_db()
+        recipe.refresh_from_db()
+        self.assertEqual(self.other_user.followers_count, 0)
+        self.assertEqual((recipe.favorites_count, recipe.in_carts_count), (0, 0))
+        self.assertEqual(self.other_user.recipes_count, 1)
+        Recipe.objects.filter(pk=recipe.pk).delete()
+        self.other_user.refresh_from_db()
+        self.assertEqual(self.other_user.recipes_count, 0)
+        call_command("reconcile_counters", "--check", stdout=io.StringIO())
+
+    def test_orm_follows_update_counters(self):
+        Follow.objects.create(user=self.user, author=self.other_user)
+        third = User.objects.create_user(
+            username="user3", email="email3@example.com", password="Pass789!@#"
+        )
+        Follow.objects.create(user=third, author=self.other_user)
+        self.other_user.refresh_from_db()
+        self.assertEqual(self.other_user.followers_count, 2)
+        Follow.objects.filter(user=self.user).delete()
+        self.other_user.refresh_from_db()
+        self.assertEqual(self.other_user.followers_count, 1)
+
+    def test_bulk_subscribe(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("users:users-subscribe-bulk")
+        ids = [self.other_user.id, self.user.id, 999999]
+        response = self.client.post(url, {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["status"] for item in response.data["results"]],
+            ["added", "self", "not_found"],
+        )
+        self.other_user.refresh_from_db()
+        self.assertEqual(self.other_user.followers_count, 1)
+        response = self.client.delete(url, {"ids": ids[:1]}, format="json")
+        self.assertEqual(response.data["results"][0]["status"], "removed")
+        response = self.client.post(url, {"ids": [2**70]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_subscribe_to_self(self):
         self.client.force_authenticate(user=self.user)
         url = reverse("users:users-subscribe", args=[self.user.id])
@@ -136,3 +202,115 @@ class UserAPITest(TestCase):
         self.assertEqual(len(response.data["results"]), 1)
         self.assertEqual(len(response.data["results"][0]["recipes"]), 1)
         self.assertEqual(response.data["results"][0]["recipes"][0]["id"], recipe.id)
+
+
+class SubscriptionFlagQueryCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username="reader", email="reader@example.com", password="Pass123!@#"
+        )
+        User.objects.bulk_create(
+            User(username=f"author{i}", email=f"author{i}@example.com")
+            for i in range(100)
+        )
+        cls.followed = list(User.objects.filter(username__startswith="author")[::2])
+        Follow.objects.bulk_create(
+            Follow(user=cls.reader, author=author) for author in cls.followed
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.reader)
+
+    def test_users_list_query_count(self):
+        url = reverse("users:users-list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"limit": 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(len(queries), 3)
+        followed_ids = {author.id for author in self.followed}
+        for user in response.data["results"]:
+            self.assertEqual(user["is_subscribed"], user["id"] in followed_ids)
+
+    def test_subscriptions_flag(self):
+        url = reverse("users:users-subscriptions")
+        response = self.client.get(url, {"limit": 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), len(self.followed))
+        self.assertTrue(all(user["is_subscribed"] for user in response.data["results"]))
+
+
+class SubscriptionRecipesPreviewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username="reader", email="reader@example.com", password="Pass123!@#"
+        )
+        User.objects.bulk_create(
+            User(username=f"author{i}", email=f"author{i}@example.com")
+            for i in range(20)
+        )
+        cls.authors = list(User.objects.filter(username__startswith="author"))
+        Recipe.objects.bulk_create(
+            Recipe(author=author, name=f"Рецепт {i}", text="Текст", cooking_time=5)
+            for author in cls.authors
+            for i in range(5)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=cls.reader, author=author) for author in cls.authors
+        )
+        call_command("reconcile_counters", stdout=io.StringIO())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.reader)
+        self.url = reverse("users:users-subscriptions")
+
+    def test_recipes_limit_and_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"limit": 20, "recipes_limit": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(len(queries), 3)
+        self.assertEqual(len(response.data["results"]), 20)
+        for author in response.data["results"]:
+            latest_ids = list(
+                Recipe.objects.filter(author_id=author["id"])
+                .order_by("-pub_date", "-id")
+                .values_list("id", flat=True)[:2]
+            )
+            self.assertEqual([r["id"] for r in author["recipes"]], latest_ids)
+            self.assertEqual(author["recipes_count"], 5)
+
+    def test_subscriptions_cursor(self):
+        seen = []
+        response = self.client.get(self.url, {"cursor": "", "limit": 7})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(author["id"] for author in response.data["results"])
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+        self.assertEqual(
+            seen,
+            [author.id for author in sorted(self.authors, key=lambda a: a.username)],
+        )
+
+    def test_malformed_cursor(self):
+        for position in (
+            [None, 1],
+            ["author1", None],
+            [["author1"], 1],
+            [{}, []],
+            ["author1", 10**24],
+        ):
+            with self.subTest(position=position):
+                cursor = base64.urlsafe_b64encode(json.dumps(position).encode())
+                response = self.client.get(self.url, {"cursor": cursor.decode()})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_recipes_limit(self):
+        for value in ("abc", "-1", "100000"):
+            with self.subTest(recipes_limit=value):
+                response = self.client.get(self.url, {"recipes_limit": value})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)